@@ -1,15 +1,161 @@
 # app.py
 import os
-from flask import Flask, send_file, abort
+import json
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from flask import Flask, abort, request, Response
+from werkzeug.routing import BaseConverter
+from collector.bundle import DataBundle
+
+
+class FipsConverter(BaseConverter):
+    # Fips of us '0', states '06' and counties '06085', not file names
+    regex = r"0|\d{2}|\d{5}"
+
 
 application = Flask(__name__)
+application.url_map.converters["fips"] = FipsConverter
+# Bytes of data file contents kept in memory, and max-age of responses
+application.config["COVID_DATA_CACHE_BYTES"] = int(
+    os.environ.get("COVID_DATA_CACHE_BYTES", 256 * 1024 * 1024)
+)
+application.config["COVID_DATA_MAX_AGE"] = int(
+    os.environ.get("COVID_DATA_MAX_AGE", 600)
+)
+
+# Content-Encoding and extension of precompressed siblings of data files,
+# x.json.br and x.json.gz written by DataDumper, in order of preference
+precompressed_encodings = (("br", "br"), ("gzip", "gz"))
+
+
+class FileCache:
+    """
+    LRU cache of file contents by path, holding at most max_bytes. Entries
+    are only used while mtime and size of the file are those it was read with.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        # (content, etag, mtime) of file path. The etag is the sha256 of
+        # content, the same as in manifest.json written by DataDumper
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.files.get(path)
+            if cached is not None and cached[0] == version:
+                self.files.move_to_end(path)
+                return cached[1]
+        with open(path, "rb") as f:
+            content = f.read()
+        entry = (content, hashlib.sha256(content).hexdigest(), stat.st_mtime)
+        if len(content) <= self.max_bytes:
+            with self.lock:
+                cached = self.files.pop(path, None)
+                if cached is not None:
+                    self.num_bytes -= len(cached[1][0])
+                self.files[path] = (version, entry)
+                self.num_bytes += len(content)
+                while self.num_bytes > self.max_bytes:
+                    (_, (_, (old_content, _, _))) = self.files.popitem(last=False)
+                    self.num_bytes -= len(old_content)
+        return entry
+
+
+file_cache = FileCache(application.config["COVID_DATA_CACHE_BYTES"])
+
+
+def send_data_file(path, mimetype):
+    # Cached content of path, or 304 if the client has it already
+    (content, etag, mtime) = file_cache.get(path)
+    response = Response(content, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = int(mtime)
+    response.cache_control.public = True
+    response.cache_control.max_age = application.config["COVID_DATA_MAX_AGE"]
+    return response.make_conditional(request)
+
+
+class BundleCache:
+    """
+    DataBundle of the bundle file written by the mesh, opened again when
+    the file is replaced.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.bundle = None
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if version != self.version:
+                self.bundle = DataBundle(path)
+                self.version = version
+            return self.bundle
+
+
+bundle_cache = BundleCache()
+
+
+@application.route("/covid/us/<fips:fips>")
+def get_covid_data_slice(fips):
+    # ?metric=deaths,confirmed&from=m/d/yy&to=m/d/yy, all metrics and
+    # days by default
+    bundle_file = os.path.join(application.root_path, "data", "covid", "us.bundle")
+    if not os.path.isfile(bundle_file):
+        abort(404)
+    bundle = bundle_cache.get(bundle_file)
+    if fips not in bundle.rows:
+        abort(404)
+    metrics = request.args.get("metric")
+    metrics = metrics.split(",") if metrics else bundle.metrics
+    if any(x not in bundle.metrics for x in metrics):
+        abort(400, f"Metrics are {', '.join(bundle.metrics)}")
+    (first_date, last_date) = (request.args.get("from"), request.args.get("to"))
+    data = {"fips": fips}
+    try:
+        for metric in metrics:
+            data[metric] = {
+                k: int(v) if v.is_integer() else v
+                for (k, v) in bundle.series_dict(
+                    metric, fips, first_date, last_date
+                ).items()
+            }
+    except ValueError:
+        abort(400, "Dates are m/d/yy, like 3/1/20")
+    # Dates in order, not sorted as strings
+    response = Response(json.dumps(data), mimetype="application/json")
+    response.cache_control.public = True
+    response.cache_control.max_age = application.config["COVID_DATA_MAX_AGE"]
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 @application.route("/covid/<path:subtypes>")
 def get_covid_data(subtypes):
     data_file = os.path.join(application.root_path, "data", "covid", subtypes)
-    if os.path.exists(data_file):
-        return send_file(data_file)
+    if os.path.isfile(data_file):
+        mimetype = mimetypes.guess_type(data_file)[0] or "application/octet-stream"
+        for (encoding, extension) in precompressed_encodings:
+            if request.accept_encodings[encoding] and os.path.exists(
+                f"{data_file}.{extension}"
+            ):
+                response = send_data_file(f"{data_file}.{extension}", mimetype)
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_data_file(data_file, mimetype)
+        response.vary.add("Accept-Encoding")
+        return response
     else:
         abort(404)
 
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import json
+import argparse
+from collector.data_cube import DataCube
+from collector.parsers import JhuParser, DescartesMobilityParser
+from collector.backtest import PredictionBacktest, get_cutoff_days
+from collector.covid_predictor import PREDICTION_ENGINES
+from collector.reconciliation import RECONCILIATION_METHODS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Errors, wall time and peak memory of predictions of past days"
+    )
+    parser.add_argument("--source", default="../covid-data-sources")
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=PREDICTION_ENGINES,
+        default=list(PREDICTION_ENGINES),
+    )
+    parser.add_argument("--days-to-predict", type=int, default=14)
+    parser.add_argument(
+        "--cutoffs", type=int, default=8, help="Number of days predictions start at"
+    )
+    parser.add_argument(
+        "--step", type=int, default=7, help="Number of days between cutoffs"
+    )
+    parser.add_argument(
+        "--min-history",
+        type=int,
+        default=30,
+        help="Only cutoffs with at least this many days of history",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes fitting predictions, one per cpu by default",
+    )
+    parser.add_argument(
+        "--reconcile-predictions", choices=RECONCILIATION_METHODS, default=None
+    )
+    parser.add_argument(
+        "--horizons",
+        default="1,7,14",
+        help="Days after cutoffs to print errors of, all of them are in --output",
+    )
+    parser.add_argument("--output", help="Json file of the results of all engines")
+    args = parser.parse_args()
+    data = DataCube()
+    jhuParser = JhuParser(data, args.source)
+    jhuParser.parse()
+    DescartesMobilityParser(
+        data,
+        args.source,
+        jhuParser.least_recent_date,
+        jhuParser.most_recent_date,
+        args.days_to_predict,
+    ).parse()
+    cutoff_days = get_cutoff_days(
+        data.least_recent_day,
+        data.most_recent_day,
+        args.days_to_predict,
+        args.cutoffs,
+        args.step,
+        args.min_history,
+    )
+    assert cutoff_days or print("Not enough history for any cutoff")
+    backtest = PredictionBacktest(
+        data,
+        args.days_to_predict,
+        cutoff_days,
+        args.workers,
+        args.reconcile_predictions,
+    )
+    horizons = [int(x) for x in args.horizons.split(",")]
+    results = []
+    for engine in args.engines:
+        result = backtest.run_in_process(engine)
+        results.append(result)
+        print(
+            f"{engine:8} {len(cutoff_days)} cutoffs {result['wall_time']:8.1f} s "
+            f"{result['peak_memory_mb']:8.0f} MB peak"
+        )
+        for (case_type, levels) in result["metrics"].items():
+            for (level, metrics) in levels.items():
+                errors = " ".join(
+                    f"day {x}: {metrics['mae'][x - 1]:.1f} "
+                    f"({metrics['mape'][x - 1]:.1f}%)"
+                    for x in horizons
+                    if x <= args.days_to_predict
+                )
+                print(f"{engine:8} {case_type:10} {level:8} MAE (MAPE) {errors}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
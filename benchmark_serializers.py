@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import json
+import time
+import argparse
+import numpy as np
+from collector.data_cube import DataCube, json_int, json_number
+from collector.data_dumper import OUTPUT_PROFILES
+from collector.serializers import SERIALIZERS
+
+
+def make_state_json(num_counties, num_days):
+    # Json data of a state like California, confirmed/deaths/mobility of
+    # num_counties counties over num_days days
+    cube = DataCube()
+    cube.set_history(0, num_days - 1)
+    cube.add_series("confirmed", np.int32, json_int)
+    cube.add_series("deaths", np.int32, json_int)
+    cube.add_series("mobility", np.float64, json_number)
+    random = np.random.default_rng(0)
+    for i in range(num_counties):
+        row = cube.add_region(f"06{2 * i + 1:03}")
+        cube.populations[row] = random.integers(1000, 10000000)
+        cube.names[row] = f"County {i}"
+        cube.hashes[row] = int(random.integers(1, 9999999))
+        for (name, scale) in (("confirmed", 1000), ("deaths", 20)):
+            series = cube.series[name]
+            series.values[row] = np.cumsum(random.poisson(scale, num_days))
+            series.present[row] = True
+        cube.series["mobility"].values[row] = random.integers(0, 150, num_days)
+        cube.series["mobility"].present[row] = True
+    for name in cube.series:
+        cube.series[name].declared[:] = True
+        if name != "mobility":
+            cube.roll_up(name, 0, num_days - 1)
+    cube.series["mobility"].values[cube.rows["06"]] = random.normal(60, 20, num_days)
+    cube.series["mobility"].present[cube.rows["06"]] = True
+    for name in ("confirmed", "deaths"):
+        cube.legends[name] = {"06": np.ones((4, num_days), dtype=np.int64)}
+    return cube.region_json("06")
+
+
+def benchmark(serializer, data, indent, repeat):
+    # (MB of output, best MB/s of repeat runs)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        content = serializer.dumps(data, indent)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    mb = len(content) / 1000000
+    return (mb, mb / best)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="MB/s of json serializers on a US state file"
+    )
+    parser.add_argument(
+        "--file", help="Json file to serialize, e.g. data/covid/us/06.json"
+    )
+    parser.add_argument("--counties", type=int, default=58)
+    parser.add_argument("--days", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data = make_state_json(args.counties, args.days)
+    for (name, serializer_class) in SERIALIZERS.items():
+        if not serializer_class.is_available():
+            print(f"{name:10} not installed")
+            continue
+        for (profile, settings) in OUTPUT_PROFILES.items():
+            (mb, mb_per_second) = benchmark(
+                serializer_class(), data, settings["indent"], args.repeat
+            )
+            print(f"{name:10} {profile:10} {mb:8.2f} MB {mb_per_second:8.1f} MB/s")
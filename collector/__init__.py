@@ -1 +1,8 @@
-from .covid_mesher import CovidMesher
+def __getattr__(name):
+    # The mesher, and the parsers and models it imports, are only loaded when
+    # used, not by the web app which only imports collector.bundle
+    if name == "CovidMesher":
+        from .covid_mesher import CovidMesher
+
+        return CovidMesher
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,137 @@
+import time
+import resource
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from .covid_predictor import CovidPredictor
+
+# Levels of regions errors are reported by, by length of their fips
+REGION_LEVELS = {1: "us", 2: "states", 5: "counties"}
+
+
+def get_cutoff_days(
+    least_recent_day, most_recent_day, days_to_predict, num_cutoffs, step, min_history
+):
+    # Last history days of num_cutoffs backtests, step days apart, the last
+    # one days_to_predict days before most_recent_day, with at least
+    # min_history days of history
+    last_cutoff = most_recent_day - days_to_predict
+    cutoffs = [last_cutoff - i * step for i in range(num_cutoffs)]
+    return sorted(x for x in cutoffs if x - least_recent_day + 1 >= min_history)
+
+
+# PredictionBacktest of a worker process, sent by the backtesting process
+_worker_backtest = None
+
+
+def _init_worker(backtest):
+    global _worker_backtest
+    _worker_backtest = backtest
+
+
+def _run_in_worker(engine):
+    # Results of the backtest of engine, with its peak memory: the peak RSS
+    # of this process plus the largest one of its prediction workers. Pages
+    # workers share with this process count twice, the other workers not
+    results = _worker_backtest.run(engine)
+    results["peak_memory_mb"] = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    ) / 1024
+    return results
+
+
+class PredictionBacktest:
+    """
+    Rolling origin backtest of CovidPredictor: at every cutoff day, all
+    regions are predicted from their cases up to the cutoff, with the
+    workers of the predictor, and compared to their cases of the
+    days_to_predict days after it. Mobility of those days is the one
+    observed since, not that of the mesh which is projected.
+    """
+
+    def __init__(
+        self, data, days_to_predict, cutoff_days, workers=1, reconciliation=None
+    ):
+        self.data = data
+        self.days_to_predict = days_to_predict
+        self.cutoff_days = cutoff_days
+        self.workers = workers
+        self.reconciliation = reconciliation
+
+    def run(self, engine):
+        """
+        Backtest of engine, {"engine", "cutoffs", "wall_time", "metrics"},
+        metrics[case_type][level] being {"mae", "mape"} lists of errors by
+        day after the cutoff, mape in percent of cases, of days with cases.
+        """
+        calendar = self.data.calendar
+        shape = (self.days_to_predict,)
+        sums = {}
+        start = time.perf_counter()
+        for cutoff_day in self.cutoff_days:
+            predictor = CovidPredictor(
+                self.data,
+                self.days_to_predict,
+                calendar.title(self.data.least_recent_day),
+                calendar.title(cutoff_day),
+                self.workers,
+                engine=engine,
+                reconciliation=self.reconciliation,
+            )
+            predictions = np.array(predictor.get_predictions(), dtype=np.float64)
+            for case_type in ("confirmed", "deaths"):
+                rows = [
+                    i for (i, x) in enumerate(predictor.regions) if x[0] == case_type
+                ]
+                fips = [predictor.regions[i][1] for i in rows]
+                (actual, present) = self.data.series_array(
+                    case_type, fips, cutoff_day + 1, cutoff_day + self.days_to_predict
+                )
+                # Absolute errors of days with cases, relative ones of days
+                # with more than 0 cases, (regions, days after the cutoff)
+                errors = np.abs(predictions[rows] - actual)
+                has_cases = present & (actual > 0)
+                relative_errors = np.where(
+                    has_cases, errors / np.where(has_cases, actual, 1), 0
+                )
+                errors = np.where(present, errors, 0)
+                levels = np.array([REGION_LEVELS[len(x)] for x in fips])
+                for level in REGION_LEVELS.values():
+                    is_level = levels == level
+                    if not is_level.any():
+                        continue
+                    level_sums = sums.setdefault(
+                        (case_type, level), [np.zeros(shape) for _ in range(4)]
+                    )
+                    for (i, values) in enumerate(
+                        (errors, present, relative_errors, has_cases)
+                    ):
+                        level_sums[i] += values[is_level].sum(axis=0)
+        wall_time = time.perf_counter() - start
+        metrics = {}
+        for ((case_type, level), level_sums) in sums.items():
+            (errors, count, relative_errors, relative_count) = level_sums
+            with np.errstate(divide="ignore", invalid="ignore"):
+                metrics.setdefault(case_type, {})[level] = {
+                    "mae": (errors / count).tolist(),
+                    "mape": (100 * relative_errors / relative_count).tolist(),
+                }
+        return {
+            "engine": engine,
+            "cutoffs": [calendar.title(x) for x in self.cutoff_days],
+            "wall_time": wall_time,
+            "metrics": metrics,
+        }
+
+    def run_in_process(self, engine):
+        # Backtest of engine in a fresh process of its own, started with a
+        # copy of the data and not forked, to also measure the peak memory
+        # of the engine without that of this process, in MB
+        with ProcessPoolExecutor(
+            1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self,),
+        ) as executor:
+            return executor.submit(_run_in_worker, engine).result()
@@ -0,0 +1,145 @@
+import os
+import json
+import math
+import struct
+import numpy as np
+from datetime import datetime
+from .utils import default_calendar
+
+BUNDLE_MAGIC = b"COVIDBDL"
+BUNDLE_VERSION = 1
+# Data offsets are multiples of this, for aligned memory maps
+BUNDLE_ALIGNMENT = 64
+# Time series in data["US"][fips]["testing"] of states and us
+TESTING_METRICS = ("settled_cases", "positive_rate", "pending_cases")
+
+
+def write_bundle(data, path):
+    """
+    Writes the DataCube data, and testing time series, as one float64 array
+    of shape (metrics, regions, days) after a json header, NaN for missing
+    values. Layout of the file:
+
+    magic (8 bytes), version and header length (little-endian uint32 each),
+    json header {"metrics", "fips", "dates", "dtype", "shape"}, padded with
+    spaces to a multiple of BUNDLE_ALIGNMENT bytes, then the array in C order.
+    """
+    calendar = data.calendar
+    fips = list(data.iter_region_fips())
+    testing = [data.attachments["US"].get(x, {}).get("testing", {}) for x in fips]
+    testing_days = {
+        title: calendar.day(title)
+        for x in testing
+        for metric in TESTING_METRICS
+        for title in x.get(metric, {}).get("time_series", {})
+    }
+    days = [data.first_day, data.first_day + data.num_days - 1]
+    days += list(testing_days.values())
+    (first_day, last_day) = (min(days), max(days))
+    metrics = list(data.series) + [f"testing/{x}" for x in TESTING_METRICS]
+    values = np.full(
+        (len(metrics), len(fips), last_day - first_day + 1), np.nan, dtype="<f8"
+    )
+    rows = [data.rows.get(x) for x in fips]
+    regions = [i for (i, x) in enumerate(rows) if x is not None]
+    rows = [rows[i] for i in regions]
+    columns = slice(
+        data.first_day - first_day, data.first_day - first_day + data.num_days
+    )
+    for (m, series) in enumerate(data.series.values()):
+        sources = series.sources[rows]
+        values[m, regions, columns] = np.where(
+            series.present[sources], series.values[sources], np.nan
+        )
+    for (m, metric) in enumerate(TESTING_METRICS, len(data.series)):
+        for (i, x) in enumerate(testing):
+            for (title, value) in x.get(metric, {}).get("time_series", {}).items():
+                if value is not None:
+                    values[m, i, testing_days[title] - first_day] = value
+    header = json.dumps(
+        {
+            "metrics": metrics,
+            "fips": fips,
+            "dates": calendar.titles(first_day, last_day),
+            "dtype": values.dtype.str,
+            "shape": values.shape,
+        }
+    ).encode("utf-8")
+    padding = -(len(BUNDLE_MAGIC) + 8 + len(header)) % BUNDLE_ALIGNMENT
+    header += b" " * padding
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(struct.pack("<II", BUNDLE_VERSION, len(header)))
+        f.write(header)
+        values.tofile(f)
+    os.replace(tmp_path, path)
+
+
+class DataBundle:
+    """
+    Memory map of a bundle written by write_bundle. Series of a region are
+    views into the map, only the pages read are loaded.
+    """
+
+    def __init__(self, path, calendar=default_calendar):
+        with open(path, "rb") as f:
+            # Not asserts, which python -O leaves out, a bad file would be
+            # misread
+            if f.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+                raise ValueError(f"{path} is not a data bundle")
+            (version, header_length) = struct.unpack("<II", f.read(8))
+            if version != BUNDLE_VERSION:
+                raise ValueError(f"Unsupported data bundle version {version}")
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        self.metrics = header["metrics"]
+        self.fips = header["fips"]
+        self.dates = header["dates"]
+        self.rows = {x: i for (i, x) in enumerate(self.fips)}
+        self.columns = {x: i for (i, x) in enumerate(self.dates)}
+        self.calendar = calendar
+        self.first_day = calendar.day_from_date(
+            datetime.strptime(self.dates[0], "%m/%d/%y")
+        )
+        self.values = np.memmap(
+            path,
+            dtype=np.dtype(header["dtype"]),
+            mode="r",
+            offset=len(BUNDLE_MAGIC) + 8 + header_length,
+            shape=tuple(header["shape"]),
+        )
+
+    def _get_day(self, title):
+        # Day of an m/d/yy title, such as one of a request, parsed without
+        # adding it to the titles of the calendar, which other threads read
+        column = self.columns.get(title)
+        if column is not None:
+            return self.first_day + column
+        return self.calendar.day_from_date(datetime.strptime(title, "%m/%d/%y"))
+
+    def _get_columns(self, first_date, last_date):
+        # Slice of columns from first_date to last_date, clamped to the date axis
+        first_column = 0
+        last_column = len(self.dates) - 1
+        if first_date is not None:
+            first_column = max(self._get_day(first_date) - self.first_day, 0)
+        if last_date is not None:
+            last_column = min(self._get_day(last_date) - self.first_day, last_column)
+        return slice(first_column, max(last_column + 1, first_column))
+
+    def series(self, metric, fips, first_date=None, last_date=None):
+        # Values of metric of region fips from first_date to last_date,
+        # inclusive, NaN for missing values. Dates are m/d/yy titles, those
+        # outside the date axis are clamped to it
+        columns = self._get_columns(first_date, last_date)
+        return self.values[self.metrics.index(metric), self.rows[fips], columns]
+
+    def series_dict(self, metric, fips, first_date=None, last_date=None):
+        # {date: value} of series without missing values
+        first_column = self._get_columns(first_date, last_date).start
+        values = self.series(metric, fips, first_date, last_date).tolist()
+        return {
+            self.dates[first_column + i]: x
+            for (i, x) in enumerate(values)
+            if not math.isnan(x)
+        }
@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+import numpy as np
+from .data_cube import DataCube
+
+
+def get_file_fingerprint(path):
+    # sha256 of file content, None for missing files
+    if not os.path.exists(path):
+        return None
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class MeshCheckpoint:
+    """
+    DataCube of the last mesh, with fingerprints of its inputs, kept in one
+    npz file for incremental meshing. The cube metadata and fingerprints are
+    stored as utf-8 encoded json in the "metadata" array.
+    """
+
+    version = 2
+
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = checkpoint_file
+
+    def load(self, calendar):
+        # (DataCube, fingerprints) of the last mesh, (None, {}) if there is none
+        if not os.path.exists(self.checkpoint_file):
+            return (None, {})
+        with np.load(self.checkpoint_file) as npz:
+            arrays = {x: npz[x] for x in npz.files}
+        metadata = json.loads(arrays.pop("metadata").tobytes().decode("utf-8"))
+        if metadata["version"] != self.version:
+            print(f"Ignoring checkpoint {self.checkpoint_file} of another version")
+            return (None, {})
+        cube = DataCube.from_checkpoint(metadata["cube"], arrays, calendar)
+        return (cube, metadata["fingerprints"])
+
+    def save(self, cube, fingerprints):
+        (cube_metadata, arrays) = cube.to_checkpoint()
+        metadata = {
+            "version": self.version,
+            "fingerprints": fingerprints,
+            "cube": cube_metadata,
+        }
+        arrays["metadata"] = np.frombuffer(
+            json.dumps(metadata, ensure_ascii=False).encode("utf-8"), dtype=np.uint8
+        )
+        folder = os.path.dirname(self.checkpoint_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # Replace the last checkpoint only once the new one is complete
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        with open(tmp_file, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_file, self.checkpoint_file)
@@ -1,27 +1,100 @@
 #!/usr/bin/env python
 
+import os
 from .parsers import JhuParser
 from .parsers import DescartesMobilityParser
 from .parsers import CovidTrackingParser
 from .parsers import Votes2016Parser
 from .data_dumper import DataDumper
-
-# from covid_predictor import CovidPredictor
+from .data_cube import DataCube
+from .bundle import write_bundle
+from .checkpoint import MeshCheckpoint, get_file_fingerprint
+from .covid_predictor import CovidPredictor
 
 
 class CovidMesher:
-    def __init__(self, data_source_folder, data_target_folder):
+    def __init__(
+        self,
+        data_source_folder,
+        data_target_folder,
+        checkpoint_file=None,
+        revision_window=7,
+        dump_workers=None,
+        dump_threads=False,
+        output_profile="pretty",
+        serializer="json",
+        bundle=True,
+        predict=False,
+        predict_workers=None,
+        predict_engine="logit",
+        prediction_cache_file=None,
+        prediction_reconciliation=None,
+    ):
         self.days_to_predict = 14
         self.data_source_folder = data_source_folder
         self.data_target_folder = data_target_folder
-        # us level: self.data["US"]['0'][confirmed/deaths/mobility/data_title]
-        # state level: self.data["US"]['06'][confirmed/deaths/mobility/data_title]
-        # county level: self.data["US"]['06']['06085'][confirmed/deaths/mobility]
-        self.data = {"US": {}}
+        # confirmed/deaths/mobility of us ('0'), states ('06') and counties ('06085')
+        # by day, testing and votes in self.data.attachments["US"][fips]
+        self.data = DataCube()
+        # Cube and source fingerprints of the last mesh, saved after every mesh
+        # if set, and used by incremental meshes
+        self.checkpoint = MeshCheckpoint(checkpoint_file) if checkpoint_file else None
+        # Number of most recent days sources may revise without a full mesh
+        self.revision_window = revision_window
+        # Pool of DataDumper, one process per cpu by default
+        self.dump_workers = dump_workers
+        self.dump_threads = dump_threads
+        # "pretty" json, or "compact" json with precompressed .gz/.br siblings
+        self.output_profile = output_profile
+        # Name of the json serializer, "auto" for the fastest one installed
+        self.serializer = serializer
+        # Also write all data as one memory-mappable file, us.bundle
+        self.bundle = bundle
+        # Predict cases of the next days_to_predict days, with a pool of
+        # predict_workers processes, one per cpu by default, fitted by
+        # predict_engine, see PREDICTION_ENGINES
+        self.predict = predict
+        self.predict_workers = predict_workers
+        self.predict_engine = predict_engine
+        # Predictions by fingerprint of their inputs, to only fit regions
+        # with other inputs than in the last mesh, if set
+        self.prediction_cache_file = prediction_cache_file
+        # Make predictions of counties add up to their state, and those of
+        # states to the us, see RECONCILIATION_METHODS, if set
+        self.prediction_reconciliation = prediction_reconciliation
+        self.fingerprints = {"days_to_predict": self.days_to_predict}
+        self.previous_fingerprints = {}
+
+    def _is_source_unchanged(self, parser):
+        # Fingerprint source files of parser, True if they are those of the last mesh
+        unchanged = (
+            self.previous_fingerprints.get("days_to_predict") == self.days_to_predict
+        )
+        for source_file in parser.get_source_files():
+            key = os.path.relpath(source_file, self.data_source_folder)
+            self.fingerprints[key] = get_file_fingerprint(source_file)
+            unchanged = unchanged and (
+                self.previous_fingerprints.get(key) == self.fingerprints[key]
+            )
+        return unchanged
 
-    def mesh(self):
-        jhuParser = JhuParser(self.data, self.data_source_folder)
+    def mesh(self, incremental=False):
+        # Incremental meshes take data of unchanged sources, and of days not
+        # revised, from the checkpoint, and only write json data of changed regions
+        previous = None
+        if incremental:
+            assert self.checkpoint is not None
+            (previous, self.previous_fingerprints) = self.checkpoint.load(
+                self.data.calendar
+            )
+        jhuParser = JhuParser(
+            self.data, self.data_source_folder, previous, self.revision_window
+        )
+        self._is_source_unchanged(jhuParser)
         jhuParser.parse()
+        if jhuParser.previous is None:
+            previous = None
+            self.previous_fingerprints = {}
         descartes = DescartesMobilityParser(
             self.data,
             self.data_source_folder,
@@ -29,18 +102,50 @@ class CovidMesher:
             jhuParser.most_recent_date,
             self.days_to_predict,
         )
-        descartes.parse()
-        # covidPredictor = CovidPredictor(
-        #    self.days_to_predict,
-        #    jhuParser.least_recent_date,
-        #    jhuParser.most_recent_date,
-        #    self.data,
-        # )
-        # covidPredictor.predict()
+        if (
+            self._is_source_unchanged(descartes)
+            and previous.least_recent_day == self.data.least_recent_day
+            and previous.most_recent_day == self.data.most_recent_day
+        ):
+            self.data.copy_series("mobility", previous)
+        else:
+            descartes.parse()
+        if self.predict:
+            covidPredictor = CovidPredictor(
+                self.data,
+                self.days_to_predict,
+                jhuParser.least_recent_date,
+                jhuParser.most_recent_date,
+                self.predict_workers,
+                engine=self.predict_engine,
+                cache_file=self.prediction_cache_file,
+                reconciliation=self.prediction_reconciliation,
+            )
+            covidPredictor.predict()
         covidTrackingParser = CovidTrackingParser(self.data, self.data_source_folder)
-        covidTrackingParser.parse()
+        if self._is_source_unchanged(covidTrackingParser):
+            self.data.copy_attachments("testing", previous)
+        else:
+            covidTrackingParser.parse()
         votes2016Parser = Votes2016Parser(self.data, self.data_source_folder)
-        votes2016Parser.parse()
+        if self._is_source_unchanged(votes2016Parser):
+            self.data.copy_attachments("votes2016", previous)
+        else:
+            votes2016Parser.parse()
 
-        dataDumper = DataDumper(self.data, self.data_target_folder)
-        dataDumper.dump_data()
+        regions = None if previous is None else self.data.changed_regions(previous)
+        if regions is not None:
+            print(f"{len(regions)} regions changed since the last mesh")
+        dataDumper = DataDumper(
+            self.data,
+            self.data_target_folder,
+            self.dump_workers,
+            self.dump_threads,
+            profile=self.output_profile,
+            serializer=self.serializer,
+        )
+        dataDumper.dump_data(regions)
+        if self.bundle and (regions is None or len(regions) > 0):
+            write_bundle(self.data, f"{self.data_target_folder}/us.bundle")
+        if self.checkpoint is not None:
+            self.checkpoint.save(self.data, self.fingerprints)
@@ -1,44 +1,177 @@
+import os
+import json
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.linear_model import LogisticRegression
-from .utils import (
-    get_date_titles,
-    get_title_future_or_past,
-    get_title_tomorrow,
-)
+from .utils import default_calendar
 from .us import state_fips_iterator
+from .data_dumper import _get_multiprocessing_context, _write_file
+from .growth_model import (
+    GROWTH_PARAMETERS,
+    fit_logistic_growth,
+    initial_growth_params,
+    logistic_growth,
+)
+from .reconciliation import RECONCILIATION_METHODS, reconcile, summing_matrix
+
+# Engines fitting predictions, the number of regions they fit per chunk, the
+# version of their model, changed with every change of their predictions, and
+# the number of iterations of fits starting from parameters of the last run:
+# "logit", scikit-learn logistic regression classifying counts of each region
+# by day and mobility, or "growth", logistic growth curves of counts with
+# mobility as covariate, fitted for all regions of a chunk at once
+PREDICTION_ENGINES = {
+    "logit": {"chunk_size": 32, "version": 1, "warm_start_iterations": None},
+    "growth": {"chunk_size": 512, "version": 1, "warm_start_iterations": 10},
+}
+
+# CovidPredictor of a worker process, inherited from the predicting process
+_worker_predictor = None
+
+
+def _init_worker(predictor):
+    global _worker_predictor
+    _worker_predictor = predictor
+
+
+def _predict_rows_in_worker(rows):
+    return _worker_predictor._predict_rows(rows)
+
+
+class PredictionCache:
+    """
+    Predicted cases of the last predictions, by fingerprint of the inputs of
+    their fits, and fitted parameters by region, in a json file. Only those
+    of the last run are kept.
+    """
+
+    version = 2
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.predictions = {}
+        self.used = {}
+        self.params = {}
+        self.used_params = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache["version"] == self.version:
+                self.predictions = cache["predictions"]
+                self.params = cache["params"]
+
+    def get(self, key):
+        predicted_cases = self.predictions.get(key)
+        if predicted_cases is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.used[key] = predicted_cases
+        return predicted_cases
+
+    def put(self, key, predicted_cases):
+        self.used[key] = predicted_cases
+
+    def get_params(self, region):
+        params = self.params.get(region)
+        if params is not None:
+            self.used_params[region] = params
+        return params
+
+    def put_params(self, region, params):
+        self.used_params[region] = params
+
+    def save(self):
+        folder = os.path.dirname(self.cache_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        cache = {
+            "version": self.version,
+            "predictions": self.used,
+            "params": self.used_params,
+        }
+        _write_file(self.cache_file, json.dumps(cache).encode("utf-8"))
 
 
 class CovidPredictor:
-    def __init__(self, data, days_to_predict, least_recent_data, most_recent_date):
+    def __init__(
+        self,
+        data,
+        days_to_predict,
+        least_recent_data,
+        most_recent_date,
+        workers=1,
+        chunk_size=None,
+        engine="logit",
+        cache_file=None,
+        reconciliation=None,
+    ):
         self.days_to_predict = days_to_predict
         self.least_recent_date = least_recent_data
         self.most_recent_date = most_recent_date
-        self.date_keys_history = get_date_titles(
-            self.least_recent_date, self.most_recent_date
+        self.calendar = default_calendar
+        most_recent_day = self.calendar.day(self.most_recent_date)
+        self.date_keys_history = self.calendar.titles(
+            self.calendar.day(self.least_recent_date), most_recent_day
         )
-        self.date_keys_prediction = []
-        self.date_keys_prediction = get_date_titles(
-            get_title_tomorrow(self.most_recent_date),
-            get_title_future_or_past(self.most_recent_date, self.days_to_predict),
+        self.date_keys_prediction = self.calendar.titles(
+            most_recent_day + 1, most_recent_day + self.days_to_predict
         )
         self.data = data
+        # Regions are fitted by a pool of worker processes, in chunks of
+        # chunk_size regions, that of the engine by default. None for one
+        # worker per cpu
+        assert engine in PREDICTION_ENGINES or print(f"No such engine {engine}")
+        self.engine = engine
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size or PREDICTION_ENGINES[engine]["chunk_size"]
+        # Regions with the inputs of a previous run take its predictions
+        self.cache = PredictionCache(cache_file) if cache_file else None
+        # Predictions of the us, states and counties are made to add up by
+        # reconciliation, see RECONCILIATION_METHODS, if set
+        assert reconciliation in RECONCILIATION_METHODS + (None,) or print(
+            f"No such reconciliation {reconciliation}"
+        )
+        self.reconciliation = reconciliation
+        # (case_type, fips) of every fit, the row of their parent region, -1
+        # for the us, and rows of their inputs: cases of history days, and
+        # mobility of history and prediction days, NaN where missing. Set by
+        # predict, read only by workers
+        self.regions = []
+        self.parents = None
+        self.cases = None
+        self.mobility = None
+        # Parameters of fits of the last run, NaN where there are none, and
+        # the number of fits by start, see _predict_rows
+        self.initial_params = None
+        self.starts = {"cold": 0, "warm": 0, "restart": 0}
 
     def predict_with_time_series(self, case_time_series, mobility_series):
-        logit = LogisticRegression(solver="lbfgs", max_iter=1000)
-        x = [
-            [d, mobility_series[self.date_keys_history[d]]]
-            for d in range(len(self.date_keys_history))
+        cases = [case_time_series[d] for d in self.date_keys_history]
+        mobility = [
+            mobility_series[d]
+            for d in self.date_keys_history + self.date_keys_prediction
         ]
-        y = [case_time_series[d] for d in self.date_keys_history]
+        predicted_cases = self._predict_cases(cases, mobility)
+        return dict(zip(self.date_keys_prediction, predicted_cases))
+
+    def _predict_cases(self, y, mobility):
+        # Cases of prediction days from cases y of history days, and mobility
+        # of history and prediction days
+        logit = LogisticRegression(solver="lbfgs", max_iter=1000)
+        x = [[d, mobility[d]] for d in range(len(self.date_keys_history))]
         y_set = set(y)
         if len(y_set) == 1:
             # Only a single value in all historic cases, should be 0
             only_value = y_set.pop()
-            return dict(
-                zip(self.date_keys_prediction, [only_value] * self.days_to_predict)
-            )
+            return [only_value] * self.days_to_predict
         x_future = [
-            [len(x) + i, mobility_series[self.date_keys_prediction[i]]]
-            for i in range(self.days_to_predict)
+            [len(x) + i, mobility[len(x) + i]] for i in range(self.days_to_predict)
         ]
         logit.fit(x, y)
         predicted_cases = logit.predict(x_future)
@@ -51,63 +184,261 @@ class CovidPredictor:
         for i in range(len(predicted_cases) - 1):
             if predicted_cases[i] > predicted_cases[i + 1]:
                 predicted_cases[i + 1] = predicted_cases[i]
+        return predicted_cases
 
-        return dict(zip(self.date_keys_prediction, predicted_cases))
+    def _predict_rows(self, rows):
+        # (predicted cases, fitted parameters, start) of rows, start being
+        # "cold", "warm" from parameters of the last run, or "restart" for
+        # cold fits after warm fits that did not converge
+        if self.engine == "growth":
+            return self._predict_growth(rows)
+        return [
+            (
+                self._predict_cases(self.cases[i].tolist(), self.mobility[i].tolist()),
+                None,
+                "cold",
+            )
+            for i in rows
+        ]
 
-    def predict(self):
-        # Anaylyze timeseries data for us, states, and counties
-        # with scikit logistic regression
-        data_us = self.data["US"]["0"]
+    def _predict_growth(self, rows):
+        # Cases of prediction days of rows, from logistic growth curves
+        # fitted to history cases relative to their largest count. Mobility
+        # is m50_index, 100 for normal mobility, and normal where missing
+        cases = self.cases[rows].astype(np.float64)
+        num_days = cases.shape[1]
+        days = np.arange(num_days + self.days_to_predict, dtype=np.float64)
+        mobility = np.nan_to_num(self.mobility[rows] / 100 - 1)
+        scale = np.maximum(cases.max(axis=1), 1)[:, None]
+        counts = cases / scale
+        params = initial_growth_params(days[:num_days], counts)
+        initial_params = self.initial_params[rows]
+        is_warm = np.isfinite(initial_params).all(axis=1)
+        params[is_warm] = initial_params[is_warm]
+        # Warm fits start close to their optimum and get a few iterations,
+        # those not converging by then start again from scratch
+        is_cold = ~is_warm
+        if is_warm.any():
+            (params[is_warm], converged, _) = fit_logistic_growth(
+                days[:num_days],
+                counts[is_warm],
+                mobility[is_warm, :num_days],
+                params[is_warm],
+                PREDICTION_ENGINES["growth"]["warm_start_iterations"],
+            )
+            is_cold[is_warm] = ~converged | ~np.isfinite(params[is_warm]).all(axis=1)
+        if is_cold.any():
+            (params[is_cold], _, _) = fit_logistic_growth(
+                days[:num_days],
+                counts[is_cold],
+                mobility[is_cold, :num_days],
+                initial_growth_params(days[:num_days], counts[is_cold]),
+            )
+        (curves, _) = logistic_growth(params, days[num_days:], mobility[:, num_days:])
+        last_cases = cases[:, -1:]
+        predicted_cases = np.rint(curves * scale)
+        predicted_cases = np.where(
+            np.isfinite(predicted_cases), predicted_cases, last_cases
+        )
+        # Only a single value in all historic cases, predict it
+        is_constant = (cases == cases[:, :1]).all(axis=1)
+        predicted_cases[is_constant] = last_cases[is_constant]
+        # Predicted cases should not drop
+        predicted_cases[:, 0] = np.maximum(predicted_cases[:, 0], last_cases[:, 0])
+        predicted_cases = np.maximum.accumulate(predicted_cases, axis=1)
+        starts = np.where(is_warm, np.where(is_cold, "restart", "warm"), "cold")
+        return list(
+            zip(
+                predicted_cases.astype(np.int64).tolist(),
+                params.tolist(),
+                starts.tolist(),
+            )
+        )
+
+    def _load_arrays(self):
+        history_days = (
+            self.calendar.day(self.least_recent_date),
+            self.calendar.day(self.most_recent_date),
+        )
+        mobility_days = (history_days[0], history_days[1] + self.days_to_predict)
+        self.cases = np.zeros(
+            (len(self.regions), len(self.date_keys_history)), dtype=np.int64
+        )
+        self.mobility = np.zeros(
+            (len(self.regions), len(self.date_keys_history) + self.days_to_predict)
+        )
+        for case_type in ("confirmed", "deaths"):
+            rows = [i for (i, x) in enumerate(self.regions) if x[0] == case_type]
+            fips = [self.regions[i][1] for i in rows]
+            (values, _) = self.data.series_array(case_type, fips, *history_days)
+            self.cases[rows] = values
+            (values, present) = self.data.series_array("mobility", fips, *mobility_days)
+            self.mobility[rows] = np.where(present, values, np.nan)
+
+    def _get_fingerprint(self, row):
+        # sha256 of the region, its inputs, the horizon and the model
+        (case_type, fips) = self.regions[row]
+        sha256 = hashlib.sha256(
+            json.dumps(
+                [
+                    self.engine,
+                    PREDICTION_ENGINES[self.engine]["version"],
+                    case_type,
+                    fips,
+                    self.least_recent_date,
+                    self.days_to_predict,
+                ]
+            ).encode("utf-8")
+        )
+        sha256.update(self.cases[row].tobytes())
+        sha256.update(self.mobility[row].tobytes())
+        return sha256.hexdigest()
+
+    def _reconcile(self, predictions):
+        # Coherent predictions of all regions, reconciled with those of
+        # confirmed and deaths cases side by side, for all days at once
+        rows = np.array(
+            [
+                [i for (i, x) in enumerate(self.regions) if x[0] == case_type]
+                for case_type in ("confirmed", "deaths")
+            ]
+        )
+        # Regions of both case types have the same fips in the same order
+        (num_regions, num_days) = (rows.shape[1], self.days_to_predict)
+        positions = np.zeros(len(self.regions), dtype=np.int64)
+        positions[rows] = np.arange(num_regions)
+        parents = np.where(
+            self.parents[rows[0]] >= 0, positions[self.parents[rows[0]]], -1
+        )
+        has_parent = parents >= 0
+        # Cases of regions with children that are not part of any child, such
+        # as unassigned cases of states, are held at their last count: they
+        # are taken out of the predictions of their region and its ancestors
+        # before reconciliation, and added back to the coherent predictions
+        last_cases = self.cases[rows, -1].T
+        child_cases = np.zeros(last_cases.shape, dtype=np.int64)
+        np.add.at(child_cases, parents[has_parent], last_cases[has_parent])
+        aggregates = np.unique(parents[has_parent])
+        (remainder_summing, remainder_bottoms) = summing_matrix(
+            np.concatenate([parents, aggregates])
+        )
+        is_remainder = remainder_bottoms >= num_regions
+        offsets = remainder_summing[:num_regions][:, is_remainder] @ (
+            last_cases[aggregates] - child_cases[aggregates]
+        )
+        (summing, bottoms) = summing_matrix(parents)
+        base = np.repeat(last_cases[:, :, None], num_days, axis=2).astype(np.float64)
+        for (i, region_rows) in enumerate(rows.T.tolist()):
+            for (j, row) in enumerate(region_rows):
+                if predictions[row] is not None:
+                    base[i, j] = predictions[row]
+        base -= offsets[:, :, None]
+        bottom = reconcile(
+            base.reshape(num_regions, -1), summing, bottoms, self.reconciliation
+        ).reshape(len(bottoms), 2, num_days)
+        # Predicted cases of bottom regions should not drop, those of regions
+        # with children, their sums, neither
+        bottom = np.maximum(np.rint(bottom), last_cases[bottoms, :, None])
+        bottom = np.maximum.accumulate(bottom, axis=2)
+        coherent = (summing @ bottom.reshape(len(bottoms), -1)).reshape(
+            num_regions, 2, num_days
+        ) + offsets[:, :, None]
+        predictions = [None] * len(self.regions)
+        for (i, region_rows) in enumerate(rows.T.tolist()):
+            for (j, row) in enumerate(region_rows):
+                predictions[row] = coherent[i, j].astype(np.int64).tolist()
+        return predictions
+
+    def get_predictions(self):
+        # Predicted cases of days_to_predict days of every region of
+        # self.regions, of the us, states and counties, without changing data
+        self.regions = []
+        parents = []
         for case_type in ["confirmed", "deaths"]:
             # Predicted cases for US
-            cases_time_series_us = data_us[case_type]["time_series"]
-            predictions_us = self.predict_with_time_series(
-                cases_time_series_us, data_us["mobility"]["time_series"],
-            )
-            data_us[case_type]["time_series"] = {
-                **cases_time_series_us,
-                **predictions_us,
-            }
+            us_row = len(self.regions)
+            self.regions.append((case_type, "0"))
+            parents.append(-1)
             for state_fips in state_fips_iterator():
-                data_state = self.data["US"][state_fips]
-                cases_time_series_state = data_state[case_type]["time_series"]
                 # Predicted cases for state with this state_fips
-                predictions_state = self.predict_with_time_series(
-                    cases_time_series_state, data_state["mobility"]["time_series"],
-                )
-                # Update data_state predictions
-                data_state[case_type]["time_series"] = {
-                    **cases_time_series_state,
-                    **predictions_state,
-                }
-                for prediction_title_state in predictions_state:
-                    # Update corresponding data_us[case_type][date][state_fips]
-                    if not prediction_title_state in data_us[case_type]:
-                        data_us[case_type][prediction_title_state] = {}
-                    data_us[case_type][prediction_title_state][
-                        state_fips
-                    ] = predictions_state[prediction_title_state]
+                state_row = len(self.regions)
+                self.regions.append((case_type, state_fips))
+                parents.append(us_row)
                 # Predict for each county in state_fips
-                for county_fips in list(data_state.keys()):
-                    if len(county_fips) != 5 or not county_fips.isdigit():
-                        continue
-                    data_county = data_state[county_fips]
-                    case_time_series_county = {
-                        x: data_county[case_type][x] for x in self.date_keys_history
-                    }
-                    mobility_county = data_county["mobility"]
-                    predicted_cases_county = self.predict_with_time_series(
-                        case_time_series_county, mobility_county
-                    )
-                    # Update county record
-                    data_county[case_type] = {
-                        **case_time_series_county,
-                        **predicted_cases_county,
-                    }
-                    for predicted_title_county in predicted_cases_county:
-                        # Update data_state[case_type][date][state_fips]
-                        if predicted_title_county not in data_state[case_type]:
-                            data_state[case_type][predicted_title_county] = {}
-                        data_state[case_type][predicted_title_county][
-                            county_fips
-                        ] = predicted_cases_county[predicted_title_county]
+                for county_fips in self.data.child_fips(state_fips):
+                    self.regions.append((case_type, county_fips))
+                    parents.append(state_row)
+        self.parents = np.array(parents, dtype=np.int64)
+        self._load_arrays()
+        predictions = [None] * len(self.regions)
+        is_fitted = np.ones(len(self.regions), dtype=bool)
+        if self.reconciliation == "bottom_up":
+            # Predictions of regions with children are sums of theirs
+            is_fitted[self.parents[self.parents >= 0]] = False
+        self.initial_params = np.full(
+            (len(self.regions), len(GROWTH_PARAMETERS)), np.nan
+        )
+        if self.cache is not None:
+            self.cache.load()
+            keys = [self._get_fingerprint(x) for x in range(len(self.regions))]
+            predictions = [
+                self.cache.get(x) if y else None
+                for (x, y) in zip(keys, is_fitted.tolist())
+            ]
+            engine = PREDICTION_ENGINES[self.engine]
+            regions = [
+                f"{self.engine}/{engine['version']}/{case_type}/{fips}"
+                for (case_type, fips) in self.regions
+            ]
+            if engine["warm_start_iterations"]:
+                for (i, region) in enumerate(regions):
+                    params = self.cache.get_params(region)
+                    if params is not None:
+                        self.initial_params[i] = params
+        # Fits only depend on their own inputs, workers may fit them in any order
+        rows = [i for (i, x) in enumerate(predictions) if x is None and is_fitted[i]]
+        chunks = [
+            rows[i : i + self.chunk_size] for i in range(0, len(rows), self.chunk_size)
+        ]
+        if self.workers <= 1 or len(chunks) <= 1:
+            results = [self._predict_rows(x) for x in chunks]
+        else:
+            # Forked workers share the input arrays with this process
+            with ProcessPoolExecutor(
+                self.workers,
+                mp_context=_get_multiprocessing_context(),
+                initializer=_init_worker,
+                initargs=(self,),
+            ) as executor:
+                results = list(executor.map(_predict_rows_in_worker, chunks))
+        for (chunk, chunk_predictions) in zip(chunks, results):
+            for (row, (predicted_cases, params, start)) in zip(
+                chunk, chunk_predictions
+            ):
+                predictions[row] = predicted_cases
+                self.starts[start] += 1
+                if self.cache is not None:
+                    self.cache.put(keys[row], predicted_cases)
+                    if params is not None:
+                        self.cache.put_params(regions[row], params)
+        if self.reconciliation is not None:
+            predictions = self._reconcile(predictions)
+        if self.cache is not None:
+            self.cache.save()
+            print(
+                f"Predictions: {self.cache.hits} cached, {self.cache.misses} fitted, "
+                f"{self.starts['warm']} of them warm started, "
+                f"{self.starts['restart']} started again cold"
+            )
+        return predictions
+
+    def predict(self):
+        # Anaylyze timeseries data for us, states, and counties
+        # with scikit logistic regression
+        predictions = self.get_predictions()
+        for ((case_type, fips), predicted_cases) in zip(self.regions, predictions):
+            # Predictions of states and counties are also part of
+            # data_us/data_state[case_type][date] through self.data
+            self.data.update_series(
+                case_type, fips, dict(zip(self.date_keys_prediction, predicted_cases)),
+            )
@@ -0,0 +1,534 @@
+import math
+import numpy as np
+from .utils import default_calendar
+from .us import split_county_fips
+
+# Keys of the color scale statistics in daily confirmed/deaths data of US and states
+LEGEND_KEYS = ("minCases", "maxCases", "minPerCapita", "maxPerCapita")
+LEGEND_DEFAULTS = (1000000, -1, 100000000, -1)
+
+
+def json_int(value):
+    return int(value)
+
+
+def json_float(value):
+    return None if math.isnan(value) else float(value)
+
+
+def json_number(value):
+    # Integral values, such as mobility indices, are written as int
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+
+# Name -> json conversion of series, for checkpoints
+JSON_CONVERSIONS = {x.__name__: x for x in (json_int, json_float, json_number)}
+
+
+class Series:
+    """
+    Values of one metric for every region row and day column of a DataCube.
+
+    A value is only part of the data if it is present. A region only has a
+    block for this metric in its json data if it is declared. A region row
+    may share the values and present of another row, sources[row], instead
+    of its own, like counties without data of their own use those of their
+    state.
+    """
+
+    def __init__(self, path, dtype, to_json, num_regions, num_days):
+        self.path = path
+        self.values = np.zeros((num_regions, num_days), dtype=dtype)
+        self.present = np.zeros((num_regions, num_days), dtype=bool)
+        self.declared = np.zeros(num_regions, dtype=bool)
+        self.sources = np.arange(num_regions, dtype=np.int64)
+        self.to_json = to_json
+
+    def _resize(self, num_regions, num_days, day_offset):
+        def resized(a):
+            b = np.zeros((num_regions, num_days), dtype=a.dtype)
+            b[: a.shape[0], day_offset : day_offset + a.shape[1]] = a
+            return b
+
+        self.values = resized(self.values)
+        self.present = resized(self.present)
+        declared = np.zeros(num_regions, dtype=bool)
+        declared[: len(self.declared)] = self.declared
+        self.declared = declared
+        sources = np.arange(num_regions, dtype=np.int64)
+        sources[: len(self.sources)] = self.sources
+        self.sources = sources
+
+    def own(self, rows):
+        # Rows stop sharing the values of other rows, before they are set
+        self.sources[rows] = rows
+
+
+class DataCube:
+    """
+    Region x metric x day arrays backing the mesh.
+
+    Regions are the US ("0"), states (2-digit fips) and counties (5-digit
+    fips). Every region row knows its parent row, counties roll up into states
+    and states into the US. Column 0 of every series is day first_day of the
+    calendar. Nested dicts in the layout of the json files are only built, one
+    region at a time, by iter_region_json.
+
+    Data without a day axis, such as testing and votes, is kept in
+    attachments, data["US"][fips][...], and merged into the json data of
+    the region.
+    """
+
+    def __init__(self, calendar=default_calendar):
+        self.calendar = calendar
+        # Range of days with reported cases
+        self.least_recent_day = None
+        self.most_recent_day = None
+        self.first_day = 0
+        self.num_days = 0
+        self.fips = []
+        self.rows = {}
+        self.parents = np.zeros(0, dtype=np.int64)
+        self.populations = np.zeros(0, dtype=np.int64)
+        self.names = []
+        self.hashes = []
+        self._children = {}
+        self.series = {}
+        # metric -> {fips -> int64 array (len(LEGEND_KEYS), number of history days)}
+        self.legends = {}
+        self.attachments = {"US": {}}
+
+    @property
+    def num_regions(self):
+        return len(self.fips)
+
+    @property
+    def least_recent_date(self):
+        return self.calendar.title(self.least_recent_day)
+
+    @property
+    def most_recent_date(self):
+        return self.calendar.title(self.most_recent_day)
+
+    def column(self, day):
+        return day - self.first_day
+
+    def columns(self, first_day, last_day):
+        return slice(self.column(first_day), self.column(last_day) + 1)
+
+    def set_history(self, least_recent_day, most_recent_day):
+        self.least_recent_day = least_recent_day
+        self.most_recent_day = most_recent_day
+        self.ensure_days(least_recent_day, most_recent_day)
+
+    def ensure_days(self, first_day, last_day):
+        if self.num_days == 0:
+            (self.first_day, self.num_days) = (first_day, 0)
+        new_first_day = min(first_day, self.first_day)
+        new_last_day = max(last_day, self.first_day + self.num_days - 1)
+        if new_first_day == self.first_day and new_last_day == (
+            self.first_day + self.num_days - 1
+        ):
+            return
+        day_offset = self.first_day - new_first_day
+        self.first_day = new_first_day
+        self.num_days = new_last_day - new_first_day + 1
+        for series in self.series.values():
+            series._resize(len(series.declared), self.num_days, day_offset)
+
+    def _ensure_capacity(self, num_regions):
+        capacity = len(self.parents)
+        if num_regions <= capacity:
+            return
+        capacity = max(num_regions, 2 * capacity, 64)
+        parents = np.full(capacity, -1, dtype=np.int64)
+        parents[: len(self.parents)] = self.parents
+        self.parents = parents
+        populations = np.zeros(capacity, dtype=np.int64)
+        populations[: len(self.populations)] = self.populations
+        self.populations = populations
+        for series in self.series.values():
+            series._resize(capacity, self.num_days, 0)
+
+    def add_region(self, fips):
+        row = self.rows.get(fips)
+        if row is not None:
+            return row
+        if fips == "0":
+            parent = -1
+        elif len(fips) == 2:
+            parent = self.add_region("0")
+        else:
+            parent = self.add_region(split_county_fips(fips)[0])
+        row = self.num_regions
+        self._ensure_capacity(row + 1)
+        self.fips.append(fips)
+        self.rows[fips] = row
+        self.parents[row] = parent
+        self.names.append(None)
+        self.hashes.append(None)
+        self._children[row] = []
+        if parent >= 0:
+            self._children[parent].append(row)
+        return row
+
+    def children(self, row):
+        return self._children[row]
+
+    def child_fips(self, fips):
+        return [self.fips[x] for x in self._children[self.rows[fips]]]
+
+    def add_series(self, name, dtype, to_json, path=None):
+        if name not in self.series:
+            self.series[name] = Series(
+                path or (name,), dtype, to_json, len(self.parents), self.num_days,
+            )
+        return self.series[name]
+
+    def roll_up(self, name, first_day, last_day):
+        # Sum values of counties into their states, and states into the US
+        series = self.series[name]
+        columns = self.columns(first_day, last_day)
+        parents = self.parents[: self.num_regions]
+        for level in (5, 2):
+            rows = np.array(
+                [i for (i, x) in enumerate(self.fips) if len(x) == level],
+                dtype=np.int64,
+            )
+            if len(rows) == 0:
+                continue
+            parent_rows = np.unique(parents[rows])
+            series.own(parent_rows)
+            series.values[parent_rows, columns] = 0
+            np.add.at(
+                series.values[:, columns],
+                parents[rows],
+                series.values[series.sources[rows], columns],
+            )
+            series.present[parent_rows, columns] = True
+
+    def update_series(self, name, fips, values_by_title):
+        # Set values of a region from a dict of date_title -> value
+        series = self.series[name]
+        row = self.add_region(fips)
+        days = [self.calendar.day(x) for x in values_by_title]
+        if len(days) > 0:
+            self.ensure_days(min(days), max(days))
+            series = self.series[name]
+            series.own(row)
+            columns = [self.column(x) for x in days]
+            series.values[row, columns] = [
+                np.nan if x is None else x for x in values_by_title.values()
+            ]
+            series.present[row, columns] = True
+        series.declared[row] = True
+
+    def set_series(self, name, fips, first_day, values, present):
+        # Set series of regions fips from (len(fips), days) arrays values and
+        # present, their column 0 is first_day
+        last_day = first_day + values.shape[1] - 1
+        self.ensure_days(first_day, last_day)
+        rows = [self.add_region(x) for x in fips]
+        series = self.series[name]
+        columns = self.columns(first_day, last_day)
+        series.own(rows)
+        series.values[rows, columns] = values
+        series.present[rows, columns] = present
+        series.declared[rows] = True
+
+    def share_series(self, name, fips, source_fips):
+        # Regions fips take series name of region source_fips by reference,
+        # without copies of its values
+        source_row = self.add_region(source_fips)
+        rows = [self.add_region(x) for x in fips]
+        series = self.series[name]
+        series.sources[rows] = series.sources[source_row]
+        series.declared[rows] = True
+
+    def series_array(self, name, fips, first_day, last_day):
+        # (values, present) (len(fips), days) arrays of series name of regions
+        # fips from first_day to last_day
+        series = self.series[name]
+        sources = series.sources[[self.rows[x] for x in fips]]
+        columns = self.columns(first_day, last_day)
+        return (series.values[sources, columns], series.present[sources, columns])
+
+    def series_dict(self, name, fips):
+        return self._row_dict(self.series[name], self.rows[fips])
+
+    def _titles(self):
+        return self.calendar.titles(self.first_day, self.first_day + self.num_days - 1)
+
+    def _row_dict(self, series, row, titles=None, shared=None):
+        # {date: value} of present days. Dicts of rows shared by other rows
+        # are kept in shared, by (series, source row), and built only once
+        source_row = int(series.sources[row])
+        if source_row == row:
+            shared = None
+        row = source_row
+        if shared is not None and (series.path, row) in shared:
+            return shared[(series.path, row)]
+        titles = titles or self._titles()
+        columns = np.flatnonzero(series.present[row]).tolist()
+        values = series.values[row, columns].tolist()
+        d = {titles[c]: series.to_json(v) for (c, v) in zip(columns, values)}
+        if shared is not None:
+            shared[(series.path, row)] = d
+        return d
+
+    def _series_json_root(self, name, series, row, titles):
+        # {"time_series": {date: value}, date: {legend..., child fips: value}}
+        d = {"time_series": self._row_dict(series, row, titles)}
+        children = self._children[row]
+        child_fips = [self.fips[x] for x in children]
+        legends = self.legends.get(name, {}).get(self.fips[row])
+        sources = series.sources[children]
+        values = series.values[sources].T.tolist()
+        present = series.present[sources].T.tolist()
+        for c in range(self.num_days):
+            day = self.first_day + c
+            daily = {}
+            if legends is not None and (
+                self.least_recent_day <= day <= self.most_recent_day
+            ):
+                i = day - self.least_recent_day
+                for (k, legend) in zip(LEGEND_KEYS, legends):
+                    daily[k] = int(legend[i])
+            elif not any(present[c]):
+                continue
+            for (f, v, p) in zip(child_fips, values[c], present[c]):
+                if p:
+                    daily[f] = series.to_json(v)
+            d[titles[c]] = daily
+        return d
+
+    def region_json(self, fips, shared=None):
+        # Json data of region fips. Passing the same shared dict for several
+        # regions builds time series of shared rows only once, and puts the
+        # same dict into the data of every region sharing it
+        data = {}
+        row = self.rows.get(fips)
+        if row is not None:
+            data = self._region_json_from_series(row, shared)
+        attachments = self.attachments["US"].get(fips)
+        if attachments is not None:
+            data.update(attachments)
+        return data
+
+    def _region_json_from_series(self, row, shared=None):
+        titles = self._titles()
+        data = {
+            "least_recent_date": self.least_recent_date,
+            "most_recent_date": self.most_recent_date,
+        }
+        is_county = len(self.fips[row]) == 5
+        for (name, series) in self.series.items():
+            if not series.declared[row]:
+                continue
+            d = data
+            for k in series.path[:-1]:
+                d = d.setdefault(k, {})
+            d[series.path[-1]] = (
+                self._row_dict(series, row, titles, shared)
+                if is_county
+                else self._series_json_root(name, series, row, titles)
+            )
+        if is_county:
+            data["population"] = int(self.populations[row])
+            data["name"] = self.names[row]
+            data["hash"] = self.hashes[row]
+        else:
+            children = self._children[row]
+            data["population"] = {
+                self.fips[x]: int(self.populations[x]) for x in children
+            }
+            data["names"] = {self.fips[x]: self.names[x] for x in children}
+            data["hashes"] = {}
+            for x in children:
+                if self.hashes[x] is not None:
+                    data["hashes"][self.hashes[x]] = self.fips[x]
+        return data
+
+    def iter_region_fips(self):
+        # US first, then for every state, its counties followed by the state
+        if "0" in self.rows:
+            yield "0"
+        for state_row in self.children(self.rows["0"]) if "0" in self.rows else []:
+            for county_row in self.children(state_row):
+                yield self.fips[county_row]
+            yield self.fips[state_row]
+        for fips in self.attachments["US"]:
+            if fips not in self.rows:
+                yield fips
+
+    def iter_region_json(self, regions=None):
+        # Json data of all regions, or only of fips in regions
+        shared = {}
+        for fips in self.iter_region_fips():
+            if regions is None or fips in regions:
+                yield (fips, self.region_json(fips, shared))
+
+    def copy_series(self, name, previous):
+        # Take series name of all regions declaring it from a previous cube
+        # of the same calendar
+        source = previous.series[name]
+        self.add_series(name, source.values.dtype, source.to_json, source.path)
+        self.ensure_days(previous.first_day, previous.first_day + previous.num_days - 1)
+        columns = self.columns(
+            previous.first_day, previous.first_day + previous.num_days - 1
+        )
+        rows = np.flatnonzero(source.declared[: previous.num_regions]).tolist()
+        for row in rows:
+            target_row = self.add_region(previous.fips[row])
+            series = self.series[name]
+            series.own(target_row)
+            series.values[target_row, columns] = source.values[row]
+            series.present[target_row, columns] = source.present[row]
+            series.declared[target_row] = True
+        # Rows shared in the previous cube are shared again
+        for row in rows:
+            source_row = int(source.sources[row])
+            if source_row != row:
+                self.share_series(name, [previous.fips[row]], previous.fips[source_row])
+
+    def copy_attachments(self, key, previous):
+        # Take attachments data["US"][fips][key] of all fips from a previous cube
+        for (fips, attachments) in previous.attachments["US"].items():
+            if key in attachments:
+                self.attachments["US"].setdefault(fips, {})[key] = attachments[key]
+
+    def changed_regions(self, previous):
+        # Fips of regions with json data other than in a previous cube. All
+        # of them if days or series differ
+        all_fips = set(self.iter_region_fips())
+        if (
+            self.least_recent_day,
+            self.most_recent_day,
+            self.first_day,
+            self.num_days,
+        ) != (
+            previous.least_recent_day,
+            previous.most_recent_day,
+            previous.first_day,
+            previous.num_days,
+        ) or [
+            (x, y.path) for (x, y) in self.series.items()
+        ] != [
+            (x, y.path) for (x, y) in previous.series.items()
+        ]:
+            return all_fips
+        num_regions = self.num_regions
+        previous_rows = np.array(
+            [previous.rows.get(x, -1) for x in self.fips], dtype=np.int64
+        )
+        changed = previous_rows < 0
+        rows = np.flatnonzero(~changed)
+        old_rows = previous_rows[rows]
+        for (name, series) in self.series.items():
+            old = previous.series[name]
+            (sources, old_sources) = (series.sources[rows], old.sources[old_rows])
+            present = series.present[sources]
+            values = np.where(present, series.values[sources], 0)
+            old_values = np.where(old.present[old_sources], old.values[old_sources], 0)
+            changed[rows] |= (
+                (series.declared[rows] != old.declared[old_rows])
+                | (present != old.present[old_sources]).any(axis=1)
+                | ~_equal_with_nan(values, old_values).all(axis=1)
+            )
+        changed[rows] |= (
+            self.populations[rows] != previous.populations[old_rows]
+        ) | np.array(
+            [
+                (self.names[x], self.hashes[x], self.child_fips(self.fips[x]))
+                != (
+                    previous.names[y],
+                    previous.hashes[y],
+                    previous.child_fips(previous.fips[y]),
+                )
+                for (x, y) in zip(rows.tolist(), old_rows.tolist())
+            ],
+            dtype=bool,
+        )
+        for (name, legends) in self.legends.items():
+            old_legends = previous.legends.get(name, {})
+            for (fips, legend) in legends.items():
+                if fips not in old_legends or not np.array_equal(
+                    legend, old_legends[fips]
+                ):
+                    changed[self.rows[fips]] = True
+        # Json data of roots include data of their children
+        for row in range(num_regions - 1, -1, -1):
+            if changed[row] and self.parents[row] >= 0:
+                changed[self.parents[row]] = True
+        regions = {self.fips[x] for x in np.flatnonzero(changed).tolist()}
+        for fips in all_fips:
+            if self.attachments["US"].get(fips) != previous.attachments["US"].get(fips):
+                regions.add(fips)
+        return regions & all_fips
+
+    def to_checkpoint(self):
+        # (Metadata dict for json, dict of arrays) of this cube
+        num_regions = self.num_regions
+        metadata = {
+            "least_recent_day": self.least_recent_day,
+            "most_recent_day": self.most_recent_day,
+            "first_day": self.first_day,
+            "num_days": self.num_days,
+            "fips": self.fips,
+            "names": self.names,
+            "hashes": self.hashes,
+            "series": [
+                [name, list(x.path), x.values.dtype.name, x.to_json.__name__]
+                for (name, x) in self.series.items()
+            ],
+            "legends": {x: list(y) for (x, y) in self.legends.items()},
+            "attachments": self.attachments,
+        }
+        arrays = {
+            "parents": self.parents[:num_regions],
+            "populations": self.populations[:num_regions],
+        }
+        for (name, series) in self.series.items():
+            arrays[f"series/{name}/values"] = series.values[:num_regions]
+            arrays[f"series/{name}/present"] = series.present[:num_regions]
+            arrays[f"series/{name}/declared"] = series.declared[:num_regions]
+            arrays[f"series/{name}/sources"] = series.sources[:num_regions]
+        for (name, legends) in self.legends.items():
+            arrays[f"legends/{name}"] = np.array(list(legends.values()), dtype=np.int64)
+        return (metadata, arrays)
+
+    @classmethod
+    def from_checkpoint(cls, metadata, arrays, calendar=default_calendar):
+        cube = cls(calendar)
+        cube.set_history(
+            metadata["first_day"], metadata["first_day"] + metadata["num_days"] - 1
+        )
+        cube.least_recent_day = metadata["least_recent_day"]
+        cube.most_recent_day = metadata["most_recent_day"]
+        for fips in metadata["fips"]:
+            cube.add_region(fips)
+        num_regions = cube.num_regions
+        assert np.array_equal(cube.parents[:num_regions], arrays["parents"])
+        cube.populations[:num_regions] = arrays["populations"]
+        cube.names = metadata["names"]
+        cube.hashes = metadata["hashes"]
+        for (name, path, dtype, to_json) in metadata["series"]:
+            series = cube.add_series(
+                name, np.dtype(dtype), JSON_CONVERSIONS[to_json], tuple(path)
+            )
+            series.values[:num_regions] = arrays[f"series/{name}/values"]
+            series.present[:num_regions] = arrays[f"series/{name}/present"]
+            series.declared[:num_regions] = arrays[f"series/{name}/declared"]
+            series.sources[:num_regions] = arrays[f"series/{name}/sources"]
+        for (name, fips) in metadata["legends"].items():
+            cube.legends[name] = dict(zip(fips, arrays[f"legends/{name}"]))
+        cube.attachments = metadata["attachments"]
+        return cube
+
+
+def _equal_with_nan(a, b):
+    if np.issubdtype(a.dtype, np.floating):
+        return (a == b) | (np.isnan(a) & np.isnan(b))
+    return a == b
@@ -1,12 +1,78 @@
 import os
+import gzip
 import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from .us import split_county_fips
+from .serializers import get_serializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Indent and precompressed siblings, x.json.gz and x.json.br, of json files
+# written by DataDumper
+OUTPUT_PROFILES = {
+    "pretty": {"indent": 4, "compressions": ()},
+    "compact": {"indent": None, "compressions": ("gz", "br")},
+}
+
+
+def _compress_gz(content):
+    # No timestamp in the header, for the same content the same file
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def _compress_br(content):
+    return brotli.compress(content, quality=11)
+
+
+# Extensions of all siblings, removed when not written, and the compressions
+# of those that can be written, br only with brotli installed
+SIBLING_EXTENSIONS = ("gz", "br")
+COMPRESSIONS = {"gz": _compress_gz}
+if brotli is not None:
+    COMPRESSIONS["br"] = _compress_br
+
+# DataDumper of a worker process, inherited from the dumping process
+_worker_dumper = None
+
+
+def _init_worker(dumper):
+    global _worker_dumper
+    _worker_dumper = dumper
+
+
+def _dump_regions_in_worker(fips_list):
+    return _worker_dumper._dump_regions(fips_list)
 
 
 class DataDumper:
-    def __init__(self, data, target_folder):
+    def __init__(
+        self,
+        data,
+        target_folder,
+        workers=1,
+        use_threads=False,
+        chunk_size=64,
+        profile="pretty",
+        serializer="json",
+    ):
         self.json_folder = target_folder
         self.data = data
+        self.profile = OUTPUT_PROFILES[profile]
+        self.serializer = get_serializer(serializer)
+        # Regions are handed out to a pool of workers, processes unless
+        # use_threads, in chunks of chunk_size. None for one worker per cpu
+        self.workers = workers or os.cpu_count()
+        self.use_threads = use_threads
+        self.chunk_size = chunk_size
+        # Relative path -> sha256 of content, of json files and their siblings
+        # in target_folder, as of the last dump. Usable as ETags for serving
+        self.manifest_file = f"{target_folder}/manifest.json"
+        self.previous_manifest = {}
 
     def _get_json_path(self, fips):
         assert len(fips) in (1, 2, 5)
@@ -23,28 +89,116 @@ class DataDumper:
         return path
 
     def _write_json_data(self, fips, data_for_fips):
+        # Manifest entries of the json file and its siblings. Files with the
+        # content they had in the last dump are not written again
         p = self._get_json_path(fips)
-        with open(p, "w", encoding="utf-8") as f:
-            json.dump(data_for_fips, f, ensure_ascii=False, indent=4)
-
-    def dump_data(self):
-        data_us = self.data["US"].pop("0", None)
-        self._write_json_data("0", data_us)
-        for state_fips in self.data["US"]:
-            data_state = self.data["US"][state_fips]
-            for k in list(data_state.keys()):
-                if len(k) == 5 and k.isdigit():
-                    # This is a county json data
-                    self._write_json_data(k, data_state.pop(k))
-            self._write_json_data(state_fips, data_state)
-
-    """
-        state_populations = self.data["US"]["0"]["population"]
-        for state_fips in state_populations:
-            print(f"population {state_fips}: {state_populations[state_fips]}")
-            county_populations = self.data["US"][state_fips]["population"]
-            for county_fips in county_populations:
-                print(
-                    f"    population {county_fips}: {county_populations[county_fips]}"
-                )
-                """
+        content = self.serializer.dumps(data_for_fips, self.profile["indent"])
+        key = os.path.relpath(p, self.json_folder)
+        entries = {key: hashlib.sha256(content).hexdigest()}
+        is_unchanged = self.previous_manifest.get(key) == entries[key]
+        if not (is_unchanged and os.path.exists(p)):
+            _write_file(p, content)
+        # Siblings not in the profile, or without their compression installed,
+        # would be stale, remove them
+        for extension in SIBLING_EXTENSIONS:
+            sibling = f"{p}.{extension}"
+            sibling_key = f"{key}.{extension}"
+            compress = COMPRESSIONS.get(extension)
+            if extension not in self.profile["compressions"] or compress is None:
+                if os.path.exists(sibling):
+                    os.remove(sibling)
+            elif (
+                is_unchanged
+                and sibling_key in self.previous_manifest
+                and os.path.exists(sibling)
+            ):
+                entries[sibling_key] = self.previous_manifest[sibling_key]
+            else:
+                compressed = compress(content)
+                entries[sibling_key] = hashlib.sha256(compressed).hexdigest()
+                _write_file(sibling, compressed)
+        return (entries, not is_unchanged)
+
+    def _dump_regions(self, fips_list):
+        # (Manifest entries, number of changed json files) of regions in
+        # fips_list. Json data is built one region at a time from self.data,
+        # time series shared by several regions only once per chunk
+        manifest = {}
+        num_changed = 0
+        shared = {}
+        for fips in fips_list:
+            (entries, is_changed) = self._write_json_data(
+                fips, self.data.region_json(fips, shared)
+            )
+            manifest.update(entries)
+            num_changed += is_changed
+        return (manifest, num_changed)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_file):
+            return {}
+        with open(self.manifest_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def dump_data(self, regions=None):
+        # Only fips in regions are written if set, json files of others are
+        # left as they are. Every file only depends on the data of its region,
+        # the order in which workers write them does not matter
+        self.previous_manifest = self._load_manifest()
+        fips_list = [
+            x for x in self.data.iter_region_fips() if regions is None or x in regions
+        ]
+        chunks = [
+            fips_list[i : i + self.chunk_size]
+            for i in range(0, len(fips_list), self.chunk_size)
+        ]
+        if self.workers <= 1 or len(chunks) <= 1:
+            results = [self._dump_regions(x) for x in chunks]
+        else:
+            results = self._dump_chunks_in_pool(chunks)
+        # Json files of regions not dumped are left as they are, keep their entries
+        manifest = {} if regions is None else dict(self.previous_manifest)
+        num_changed = 0
+        for (entries, num_changed_in_chunk) in results:
+            for key in entries:
+                for extension in SIBLING_EXTENSIONS:
+                    manifest.pop(f"{key}.{extension}", None)
+            manifest.update(entries)
+            num_changed += num_changed_in_chunk
+        if manifest != self.previous_manifest or not os.path.exists(self.manifest_file):
+            _write_file(
+                self.manifest_file,
+                json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"),
+            )
+        print(f"{num_changed} of {len(fips_list)} json files changed")
+
+    def _dump_chunks_in_pool(self, chunks):
+        if self.use_threads:
+            executor = ThreadPoolExecutor(self.workers)
+            dump_regions = self._dump_regions
+        else:
+            # Forked workers share self.data with this process, copy on write
+            executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=_get_multiprocessing_context(),
+                initializer=_init_worker,
+                initargs=(self,),
+            )
+            dump_regions = _dump_regions_in_worker
+        with executor:
+            return list(executor.map(dump_regions, chunks))
+
+
+def _write_file(path, content):
+    # Readers of path see either the old or the new content, never a part
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _get_multiprocessing_context():
+    # fork avoids pickling self.data for every worker, where available
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
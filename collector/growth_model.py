@@ -0,0 +1,100 @@
+import numpy as np
+
+# Columns of growth curve parameters of regions: log of the final size,
+# relative to the largest count, log of the growth rate, day of the inflection
+# point, and shift of the curve per unit of mobility
+GROWTH_PARAMETERS = ("log_size", "log_rate", "midpoint", "mobility")
+
+
+def logistic_growth(params, days, mobility):
+    # (curves, jacobians) of cumulative counts of regions, size / (1 +
+    # exp(-(rate * (day - midpoint) + mobility effect * mobility))), of
+    # (regions, days) shape and (regions, days, parameters)
+    # Log parameters of steps far off are clipped, their errors are only worse
+    size = np.exp(np.clip(params[:, 0], -20, 20))[:, None]
+    rate = np.exp(np.clip(params[:, 1], -20, 20))[:, None]
+    elapsed = days[None, :] - params[:, 2:3]
+    z = np.clip(rate * elapsed + params[:, 3:4] * mobility, -50, 50)
+    sigmoid = 1 / (1 + np.exp(-z))
+    curves = size * sigmoid
+    slope = curves * (1 - sigmoid)
+    jacobians = np.stack(
+        [curves, slope * rate * elapsed, -slope * rate, slope * mobility], axis=-1
+    )
+    return (curves, jacobians)
+
+
+def initial_growth_params(days, counts):
+    # Curves at their inflection point on the last day, twice as large in
+    # the end, growing as fast as counts did in their last week
+    last_week = max(len(days) - 8, 0)
+    growth = np.log((counts[:, -1] + 1e-3) / (counts[:, last_week] + 1e-3)) / (
+        days[-1] - days[last_week] or 1
+    )
+    params = np.zeros((len(counts), len(GROWTH_PARAMETERS)))
+    params[:, 0] = np.log(2)
+    params[:, 1] = np.log(np.clip(2 * growth, 0.02, 1))
+    params[:, 2] = days[-1]
+    return params
+
+
+def fit_logistic_growth(
+    days, counts, mobility, params=None, max_iterations=100, tolerance=1e-10
+):
+    """
+    Least squares fit of logistic_growth to (regions, days) counts, scaled to
+    at most 1, of all regions at once by Levenberg-Marquardt. Every region
+    has its own damping and stops once an iteration improves its squared
+    error by less than tolerance, relative to the error, or its steps become
+    negligible. Fits start from params, such as those of the last fit, or
+    initial_growth_params.
+
+    Returns (params, converged, iterations) of regions.
+    """
+    num_regions = len(counts)
+    if params is None:
+        params = initial_growth_params(days, counts)
+    params = params.copy()
+    iterations = np.zeros(num_regions, dtype=np.int64)
+    damping = np.full(num_regions, 1e-3)
+    converged = np.zeros(num_regions, dtype=bool)
+    (curves, jacobians) = logistic_growth(params, days, mobility)
+    residuals = curves - counts
+    errors = (residuals ** 2).sum(axis=1)
+    identity = np.eye(len(GROWTH_PARAMETERS))
+    for _ in range(max_iterations):
+        if converged.all():
+            break
+        iterations += ~converged
+        transposed = jacobians.transpose(0, 2, 1)
+        hessians = transposed @ jacobians
+        gradients = (transposed @ residuals[:, :, None])[:, :, 0]
+        # Damped towards gradient descent, scaled by the curvature of each
+        # parameter, for bad steps
+        diagonals = np.einsum("rpp->rp", hessians)[:, :, None] * identity
+        steps = -np.linalg.solve(
+            hessians + damping[:, None, None] * (diagonals + 1e-9 * identity),
+            gradients[:, :, None],
+        )[:, :, 0]
+        new_params = params + steps
+        (new_curves, new_jacobians) = logistic_growth(new_params, days, mobility)
+        new_residuals = new_curves - counts
+        new_errors = (new_residuals ** 2).sum(axis=1)
+        is_better = ~converged & np.isfinite(new_errors) & (new_errors < errors)
+        # Fits starting at their optimum, such as warm starts, stop as soon as
+        # their steps become negligible, not once their damping gave up
+        is_small = np.abs(steps).max(axis=1) <= np.sqrt(tolerance) * (
+            np.abs(params).max(axis=1) + np.sqrt(tolerance)
+        )
+        converged |= (
+            (is_better & (errors - new_errors <= tolerance * (errors + tolerance)))
+            | (~converged & is_small)
+            | (damping > 1e10)
+        )
+        params[is_better] = new_params[is_better]
+        curves[is_better] = new_curves[is_better]
+        jacobians[is_better] = new_jacobians[is_better]
+        residuals[is_better] = new_residuals[is_better]
+        errors[is_better] = new_errors[is_better]
+        damping = np.where(is_better, damping / 10, damping * 10)
+    return (params, converged, iterations)
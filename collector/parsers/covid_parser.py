@@ -1,28 +1,84 @@
 import abc
 import csv
-from collector.utils import get_date_from_title, get_title_from_date, date_range
+import numpy as np
+from collector.utils import default_calendar
 
 
 class CovidParser(abc.ABC):
     def __init__(self, data, data_source_folder):
         self.data = data
         self.data_source_folder = data_source_folder
+        self.calendar = default_calendar
 
     @abc.abstractmethod
     def parse(self):
         pass
 
-    def partition_csv_line(self, line):
-        return list(csv.reader([line]))[0]
+    # Files read by parse, fingerprinted for incremental meshing
+    def get_source_files(self):
+        return []
+
+    @staticmethod
+    def read_csv(csv_file, columns=None, converters=None):
+        # Dicts of header -> cell of the lines of csv_file, read once with one
+        # reader. Only cells of columns, all by default, converted by
+        # converters[header], such as int, if any. Cells missing at the end of
+        # short lines are left out, empty lines are skipped
+        converters = converters or {}
+        with open(csv_file, newline="") as fp:
+            reader = csv.reader(fp)
+            headers = next(reader, [])
+            projection = [
+                (i, x, converters.get(x))
+                for (i, x) in enumerate(headers)
+                if columns is None or x in columns
+            ]
+            for row in reader:
+                if len(row) == 0:
+                    continue
+                yield {
+                    x: row[i] if convert is None else convert(row[i])
+                    for (i, x, convert) in projection
+                    if i < len(row)
+                }
+
+    @staticmethod
+    def read_csv_table(csv_file, columns, values_after, dtype):
+        # (value headers, dicts of header -> cell of columns, (lines, value
+        # headers) array of dtype) of csv_file, values being all columns after
+        # the last of headers values_after in the file, all columns if none of
+        # them is. Lines of another number of cells than headers are skipped
+        with open(csv_file, newline="") as fp:
+            reader = csv.reader(fp)
+            headers = next(reader, [])
+            first_value_column = max(
+                (headers.index(x) + 1 for x in values_after if x in headers), default=0,
+            )
+            projection = [(headers.index(x), x) for x in columns if x in headers]
+            rows = []
+            cells = []
+            for row in reader:
+                if len(row) == 0:
+                    continue
+                if len(row) != len(headers):
+                    print(f"Ignoring line with {len(row)} columns: {row}")
+                    continue
+                rows.append({x: row[i] for (i, x) in projection})
+                cells.append(row[first_value_column:])
+        value_headers = headers[first_value_column:]
+        values = np.array(cells, dtype=dtype).reshape(len(cells), len(value_headers))
+        return (value_headers, rows, values)
 
     def process_date_range(self, start_date_title, end_date_title, date_handler):
-        for d in date_range(
-            get_date_from_title(start_date_title), get_date_from_title(end_date_title)
-        ):
-            date_handler(get_title_from_date(d))
+        start_day = self.calendar.day(start_date_title)
+        end_day = self.calendar.day(end_date_title)
+        step = 1 if end_day > start_day else -1
+        for day in range(start_day, end_day + step, step):
+            date_handler(self.calendar.title(day))
 
+    # Data not backed by self.data series, data["US"][fips][...]
     def get_data(self, *field_names):
-        d = self.data
+        d = self.data.attachments
         for field_name in field_names:
             d = d.setdefault(field_name, {})
         return d
@@ -1,8 +1,8 @@
 #
-# This parser adds the following data fields to self.data:
-# self.data["US"]["0"]["testing"]["settled_cases"]
-# self.data["US"]["0"]["testing"]["positive_rate"]
-# self.data["US"]["0"]["testing"]["pending_cases"]
+# This parser adds the following data fields to self.data.attachments:
+# self.data.attachments["US"]["0"]["testing"]["settled_cases"]
+# self.data.attachments["US"]["0"]["testing"]["positive_rate"]
+# self.data.attachments["US"]["0"]["testing"]["pending_cases"]
 # Each of the above three are a dict of [date_label][state_fips]=state_data_for_date
 #  and ["time_series"][date_label]=us_data_for_date
 #
@@ -10,11 +10,14 @@
 # Per https://covidtracking.com/data, the ICU and hospitalization data
 # are sparse, highly caveated and should not be used for nation-wide stats.
 # State ICU and hospitalization data, however, can still be shown when available
-import math
+import numpy as np
 from .covid_parser import CovidParser
-from ..utils import get_title_from_date, get_title_from_yyyymmdd, get_title_yesterday
 from ..us import state_fips_map
 
+# Columns read from the us and states csv files, cases being counts
+TESTING_COLUMNS = ("date", "state", "positive", "negative", "pending")
+CASE_COLUMNS = ("positive", "negative", "pending")
+
 
 class CovidTrackingParser(CovidParser):
     def __init__(self, data, data_source_folder):
@@ -25,139 +28,141 @@ class CovidTrackingParser(CovidParser):
         self.source_file_us_states = (
             f"{data_source_folder}/covid-tracking-data/data/states_daily_4pm_et.csv"
         )
-        self.headers_us = []
-        self.headers_us_states = []
         self.most_recent_date = None
         self.least_recent_date = None
+        # (row, day, settled_cases, positive_cases, pending_cases) of csv
+        # lines, us and states rows in fips_rows, then (fips, day) arrays
+        # from first_day on of these, loaded from the records
+        self.fips_rows = {"0": 0}
+        self.records = []
+        self.first_day = None
+        self.present = None
+        self.settled_cases = None
+        self.positive_cases = None
+        self.pending_cases = None
+        self.positive_rates = None
+
+    def get_source_files(self):
+        return [self.source_file_us, self.source_file_us_states]
 
     def parse(self):
         self._process_csv_us()
         self._process_csv_us_states()
-        # So far positive_rate fields contain positive_cases, replace with positive_rates
+        self._load_arrays()
         self._calculate_positive_rates()
-
-    def _parse_data_line(self, data_line, headers):
-        return dict(zip(headers, self.partition_csv_line(data_line),))
-
-    def _process_csv(self, source_file, header_line_handler, data_line_handler):
-        with open(source_file) as fp:
-            header_line = fp.readline()
-            header_line_handler(header_line)
-            current_line = fp.readline()
-            is_first_data_line = True
-            date_processed = None
-            while current_line:
-                date_processed = data_line_handler(current_line)
-                if is_first_data_line and not self.most_recent_date:
-                    self.most_recent_date = get_title_from_yyyymmdd(date_processed)
-                current_line = fp.readline()
-            if not self.least_recent_date:
-                self.least_recent_date = get_title_from_yyyymmdd(date_processed)
-
-    def _parse_header_us(self, header_line):
-        self.headers_us = self.partition_csv_line(header_line)
-
-    def _handle_data_line_us(self, current_line):
-        d = self._parse_data_line(current_line, self.headers_us)
+        self._write_data()
+
+    def _process_csv(self, source_file, data_line_handler):
+        # Lines are most recent first
+        date_processed = None
+        converters = {x: _parse_count for x in CASE_COLUMNS}
+        for d in self.read_csv(source_file, TESTING_COLUMNS, converters):
+            date_processed = data_line_handler(d)
+            if date_processed and not self.most_recent_date:
+                self.most_recent_date = self._get_date_label(date_processed)
+        if not self.least_recent_date:
+            self.least_recent_date = self._get_date_label(date_processed)
+
+    def _get_date_label(self, yyyymmdd):
+        return self.calendar.title(self.calendar.day_from_yyyymmdd(yyyymmdd))
+
+    def _handle_data_line_us(self, d):
         if not "date" in d:
-            print(f"No date in line '{current_line}'', skiping")
+            print(f"No date in line {d}, skiping")
             return
-        (settled_cases, positive_cases, pending_cases) = _extract_testing_data(d)
-        date_label = get_title_from_yyyymmdd(d["date"])
-        us_settled_cases_ts = self.get_data_us_settled_cases_ts()
-        us_settled_cases_ts[date_label] = settled_cases
-        us_positive_rate_ts = self.get_data_us_positive_rate_ts()
-        # Use cases as placeholder for now, will calc later
-        us_positive_rate_ts[date_label] = positive_cases
-        us_pending_cases_ts = self.get_data_us_pending_cases_ts()
-        us_pending_cases_ts[date_label] = pending_cases
+        self._add_record("0", d["date"], _extract_testing_data(d))
         return d["date"]
 
-    def _parse_header_us_states(self, header_line):
-        self.headers_us_states = self.partition_csv_line(header_line)
-
-    def _handle_data_line_us_states(self, current_line):
-        d = self._parse_data_line(current_line, self.headers_us_states)
-        if not _is_valid_state_line(d, current_line):
+    def _handle_data_line_us_states(self, d):
+        if not _is_valid_state_line(d):
             return
         state_fips = state_fips_map[d["state"]]
-        (settled_cases, positive_cases, pending_cases) = _extract_testing_data(d)
-        date_label = get_title_from_yyyymmdd(d["date"])
-        state_settled_cases_ts = self.get_data_state_settled_cases_ts(state_fips)
-        state_settled_cases_ts[date_label] = settled_cases
-        state_positive_rate_ts = self.get_data_state_positive_rate_ts(state_fips)
-        state_positive_rate_ts[date_label] = positive_cases
-        state_pending_cases_ts = self.get_data_state_pending_cases_ts(state_fips)
-        state_pending_cases_ts[date_label] = pending_cases
-        us_settled_cases_dl = self.get_data_us_settled_cases_dl(date_label)
-        us_settled_cases_dl[state_fips] = settled_cases
-        us_positive_rate_dl = self.get_data_us_positive_rate_dl(date_label)
-        us_positive_rate_dl[state_fips] = positive_cases
-        us_pending_cases_dl = self.get_data_us_pending_cases_dl(date_label)
-        us_pending_cases_dl[state_fips] = pending_cases
+        self._add_record(state_fips, d["date"], _extract_testing_data(d))
         return d["date"]
 
+    def _add_record(self, fips, yyyymmdd, testing_data):
+        row = self.fips_rows.setdefault(fips, len(self.fips_rows))
+        day = self.calendar.day_from_yyyymmdd(yyyymmdd)
+        self.records.append((row, day) + testing_data)
+
     def _process_csv_us(self):
-        self._process_csv(
-            self.source_file_us, self._parse_header_us, self._handle_data_line_us
-        )
+        self._process_csv(self.source_file_us, self._handle_data_line_us)
 
     def _process_csv_us_states(self):
-        self._process_csv(
-            self.source_file_us_states,
-            self._parse_header_us_states,
-            self._handle_data_line_us_states,
+        self._process_csv(self.source_file_us_states, self._handle_data_line_us_states)
+
+    def _load_arrays(self):
+        records = np.array(self.records, dtype=np.int64).reshape(-1, 5)
+        (rows, days) = (records[:, 0], records[:, 1])
+        range_days = [
+            self.calendar.day(x)
+            for x in (self.least_recent_date, self.most_recent_date)
+            if x is not None
+        ]
+        self.first_day = min(days.tolist() + range_days)
+        shape = (
+            len(self.fips_rows),
+            max(days.tolist() + range_days) - self.first_day + 1,
         )
-
-    def _date_handler_positive_rates(self, date_label):
-        # Process us rates
-        positive_rate_ts = self.get_data_us_positive_rate_ts()
-        settled_cases = self.get_data_us_settled_cases_ts().get(date_label, 0)
-        positive_cases = positive_rate_ts.get(date_label, 0)
-        prev_settled_cases = 0
-        prev_positive_cases = 0
-        if date_label != self.least_recent_date:
-            prev_settled_cases = self.get_data_us_settled_cases_ts().get(
-                get_title_yesterday(date_label), 0
-            )
-            prev_positive_cases = self.get_data_us_positive_rate_ts().get(
-                get_title_yesterday(date_label), 0
-            )
-        positive_rate_ts[date_label] = _get_positive_rate(
-            settled_cases, positive_cases, prev_settled_cases, prev_positive_cases
+        columns = days - self.first_day
+        self.present = np.zeros(shape, dtype=bool)
+        self.present[rows, columns] = True
+        (self.settled_cases, self.positive_cases, self.pending_cases) = (
+            np.zeros(shape, dtype=np.int64) for _ in range(3)
+        )
+        self.settled_cases[rows, columns] = records[:, 2]
+        self.positive_cases[rows, columns] = records[:, 3]
+        self.pending_cases[rows, columns] = records[:, 4]
+
+    def _get_range_columns(self):
+        return slice(
+            self.calendar.day(self.least_recent_date) - self.first_day,
+            self.calendar.day(self.most_recent_date) - self.first_day + 1,
         )
-        # Process us states
-        for state_fips in state_fips_map.values():
-            positive_rate_ts = self.get_data_state_positive_rate_ts(state_fips)
-            if len(positive_rate_ts) == 0:
-                # No date for this fips
-                continue
-            settled_cases = self.get_data_state_settled_cases_ts(state_fips).get(
-                date_label, 0
-            )
-            positive_cases = positive_rate_ts.get(date_label, 0)
-            prev_settled_cases = 0
-            prev_positive_cases = 0
-            if date_label != self.least_recent_date:
-                prev_settled_cases = self.get_data_state_settled_cases_ts(
-                    state_fips
-                ).get(get_title_yesterday(date_label), 0)
-                prev_positive_cases = self.get_data_state_positive_rate_ts(
-                    state_fips
-                ).get(get_title_yesterday(date_label), 0)
-            positive_rate = _get_positive_rate(
-                settled_cases, positive_cases, prev_settled_cases, prev_positive_cases
-            )
-            positive_rate_ts[date_label] = positive_rate
-            self.get_data_us_positive_rate_dl(date_label)[state_fips] = positive_rate
 
     def _calculate_positive_rates(self):
-        # Calculate us positive_rates
-        self.process_date_range(
-            self.most_recent_date,
-            self.least_recent_date,
-            self._date_handler_positive_rates,
+        # Daily positive rate of all days from least_ to most_recent_date, of
+        # the us and of states with data, missing days count as 0 cases.
+        # Previous cases of least_recent_date are 0
+        columns = self._get_range_columns()
+        settled_cases = self.settled_cases[:, columns]
+        positive_cases = self.positive_cases[:, columns]
+        new_settled_cases = np.diff(settled_cases, axis=1, prepend=0)
+        new_positive_cases = np.diff(positive_cases, axis=1, prepend=0)
+        is_valid = new_settled_cases > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = np.floor(10000 * new_positive_cases / new_settled_cases)
+        self.positive_rates = np.where(is_valid, rates, 0) / 100
+
+    def _write_data(self):
+        # Time series of the us and states, and us[date_label][state_fips], of
+        # testing data, most recent first like in the csv files
+        columns = self._get_range_columns()
+        titles = self.calendar.titles(
+            self.first_day, self.first_day + self.present.shape[1] - 1
         )
+        for (fips, row) in self.fips_rows.items():
+            for (data_type, values) in (
+                ("settled_cases", self.settled_cases),
+                ("positive_rate", self.positive_cases),
+                ("pending_cases", self.pending_cases),
+            ):
+                series = self.get_data_state_time_series(fips, ["testing", data_type])
+                present = self.present[row].copy()
+                values = values[row].tolist()
+                # Positive cases of days with rates are replaced by rates
+                if data_type == "positive_rate":
+                    present[columns] = True
+                    values[columns] = self.positive_rates[row].tolist()
+                for c in np.flatnonzero(present)[::-1].tolist():
+                    series[titles[c]] = values[c]
+                    if fips != "0":
+                        self.get_data_us_date_label(["testing", data_type], titles[c])[
+                            fips
+                        ] = values[c]
+        # States without data have empty positive rates
+        for state_fips in state_fips_map.values():
+            self.get_data_state_positive_rate_ts(state_fips)
 
     def get_data_state_settled_cases_ts(self, fips):
         return self.get_data_state_time_series(fips, ["testing", "settled_cases"])
@@ -201,30 +206,23 @@ class CovidTrackingParser(CovidParser):
 
 
 def _extract_testing_data(d):
-    positive = int(d["positive"]) if "positive" in d and d["positive"] != "" else 0
-    negative = int(d["negative"]) if "negative" in d and d["negative"] != "" else 0
-    pending_cases = int(d["pending"]) if "pending" in d and d["pending"] != "" else 0
+    positive = d.get("positive", 0)
+    negative = d.get("negative", 0)
+    pending_cases = d.get("pending", 0)
     settled_cases = positive + negative
     return (settled_cases, positive, pending_cases)
 
 
-def _get_positive_rate(
-    settled_cases, positive_cases, prev_settled_cases, prev_positive_cases
-):
-    new_settled_cases = settled_cases - prev_settled_cases
-    return (
-        math.floor(10000 * (positive_cases - prev_positive_cases) / new_settled_cases)
-        if new_settled_cases > 0
-        else 0
-    ) / 100
+def _parse_count(cell):
+    return int(cell) if cell != "" else 0
 
 
-def _is_valid_state_line(d, line):
+def _is_valid_state_line(d):
     if not "date" in d:
-        print(f"No date in line '{line}', skiping")
+        print(f"No date in line {d}, skiping")
         return False
     if "state" not in d:
-        print(f"No state info in line '{line}', skiping")
+        print(f"No state info in line {d}, skiping")
         return False
     if d["state"] not in state_fips_map:
         print(f"No such state in state_fips_map: {d['state']}")
@@ -1,11 +1,6 @@
-from datetime import date
-import ndjson
-from ..utils import (
-    get_title_from_date,
-    get_date_from_title,
-    get_date_titles,
-    get_title_future_or_past,
-)
+import json
+import math
+import numpy as np
 from ..us import (
     state_fips_iterator,
     fips_state_map,
@@ -28,142 +23,190 @@ class DescartesMobilityParser(CovidParser):
     ):
         super().__init__(data, data_source_folder)
         self.ndjson_path = f"{data_source_folder}/DL-COVID-19/DL-us-mobility.ndjson"
-        self.m50 = {}  # fips->{date->m50} absolute mobility level defined by Descartes
-        self.m50_index = {}  # fips-> {date->m50_index}, 100*m50/m50_norm
+        # (fips, day) arrays from day first_day on, patched by load. Values
+        # are NaN where not present
+        self.fips_rows = {}  # fips -> row of m50 and m50_index
+        self.first_day = None
+        self.m50 = None  # absolute mobility level defined by Descartes
+        self.m50_present = None
+        self.m50_index = None  # 100*m50/m50_norm
+        self.m50_index_present = None
         self.start_date_title = start_date_title
         self.end_date_title = end_date_title
         self.days_to_predict = days_to_predict
-        self.load()
+        self.start_day = self.calendar.day(start_date_title)
+        self.end_day = self.calendar.day(end_date_title)
+
+    def get_source_files(self):
+        return [self.ndjson_path]
 
     def load(self):
+        # One record per line, only fips, date, m50 and m50_index are kept, as
+        # arrays, until all records are read and the range of days is known
+        records = {}
         with open(self.ndjson_path) as f:
-            reader = ndjson.reader(f)
-            for record in reader:
-                fips = record["fips"]
-                date_list = [format_date_title(x) for x in record["date"]]
-                m50_list = record["m50"]
-                m50_index_list = record["m50_index"]
-                self.m50[fips] = dict(zip(date_list, m50_list))
-                self.m50_index[fips] = dict(zip(date_list, m50_index_list))
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                days = np.array(
+                    [self.calendar.day_from_iso(x) for x in record["date"]],
+                    dtype=np.int64,
+                )
+                records[record["fips"]] = (
+                    days,
+                    _get_mobility_array(record["m50"]),
+                    _get_mobility_array(record["m50_index"]),
+                )
+        # Days of records, and days mobility is patched for
+        days = [self.start_day, self.end_day + self.days_to_predict]
+        for (record_days, _, _) in records.values():
+            if len(record_days) > 0:
+                days += [int(record_days.min()), int(record_days.max())]
+        self.first_day = min(days)
+        last_day = max(days)
+        shape = (len(records) + 1, last_day - self.first_day + 1)
+        self.m50 = np.full(shape, np.nan)
+        self.m50_index = np.full(shape, np.nan)
+        for (row, (fips, (days, m50, m50_index))) in enumerate(records.items()):
+            self.fips_rows[fips] = row
+            self.m50[row, days - self.first_day] = m50
+            self.m50_index[row, days - self.first_day] = m50_index
         # Generate US average m50 and m50_index
-        self.m50["0"] = _get_us_weighted_average(self.m50)
-        self.m50_index["0"] = _get_us_weighted_average(self.m50_index)
-
-    def get_m50(self, fips):
-        return self._get_local_mobility_data(self.m50, fips)
-
-    def get_m50_index(self, fips):
-        return self._get_local_mobility_data(self.m50_index, fips)
+        self.fips_rows["0"] = len(records)
+        for values in (self.m50, self.m50_index):
+            values[self.fips_rows["0"]] = np.round(
+                self.get_state_group_averages(values, [list(state_fips_iterator())])[0]
+            )
+        (self.m50, self.m50_present) = self.patch_daily_mobility(self.m50)
+        (self.m50_index, self.m50_index_present) = self.patch_daily_mobility(
+            self.m50_index
+        )
+
+    def get_state_group_averages(self, values, state_groups):
+        # (len(state_groups), days) population weighted averages of (fips,
+        # day) values of groups of state fips, such as census divisions
+        fips = [x for group in state_groups for x in group]
+        groups = [i for (i, group) in enumerate(state_groups) for _ in group]
+        weights = [
+            fips_state_map[x]["population"] / united_states["population"] for x in fips
+        ]
+        return get_weighted_average(
+            values[[self.fips_rows[x] for x in fips]],
+            np.array(weights),
+            np.array(groups, dtype=np.int64),
+            len(state_groups),
+        )
+
+    def _get_mobility_dict(self, values, row, present=None):
+        # {date_title: value} of present days, those with data by default
+        present = ~np.isnan(values[row]) if present is None else present[row]
+        columns = np.flatnonzero(present).tolist()
+        titles = (
+            self.calendar.titles(self.first_day, self.first_day + columns[-1])
+            if columns
+            else []
+        )
+        return {
+            titles[c]: None if math.isnan(x) else x
+            for (c, x) in zip(columns, values[row, columns].tolist())
+        }
 
-    def _get_local_mobility_data(self, mobility_data_dict, fips):
-        if fips in mobility_data_dict:
-            return self.patch_daily_mobility(mobility_data_dict[fips])
+    def _get_row(self, fips):
+        if fips in self.fips_rows:
+            return self.fips_rows[fips]
         # We know we have mobility data for all states
         if is_county_fips(fips):
-            return self.patch_daily_mobility(
-                mobility_data_dict[split_county_fips(fips)[0]]
-            )
+            return self.fips_rows[split_county_fips(fips)[0]]
         print(f"Invalid fips {fips} when retrieving mobility data")
 
+    def get_m50(self, fips):
+        row = self._get_row(fips)
+        if row is not None:
+            return self._get_mobility_dict(self.m50, row, self.m50_present)
+
+    def get_m50_index(self, fips):
+        row = self._get_row(fips)
+        if row is not None:
+            return self._get_mobility_dict(self.m50_index, row, self.m50_index_present)
+
     def get_us_m50(self):
-        return self.patch_daily_mobility(self.m50["0"])
+        return self.get_m50("0")
 
     def get_us_m50_index(self):
-        mobility_data = self.patch_daily_mobility(self.m50_index["0"])
-        counter = 0
-        for k in mobility_data:
-            counter += 1
-        return mobility_data
+        return self.get_m50_index("0")
 
     #
-    # Make sure daily_mobility dictionary  (date_title-> m50 or m50_index)
-    # has all values between start_ to end_date_title. Missing values are
-    # filled with last seen value. Values missing at the front are filled
-    # with the first value
+    # Make sure daily mobility of all fips, (fips, day) values from first_day
+    # on, has values for all days between start_ and end_date_title. Missing
+    # values are filled with last seen value. Values missing at the front are
+    # filled with the first value. Days after end_date_title, up to
+    # days_to_predict days later, get the value of end_date_title.
+    # Returns (values, present), days of values outside these ranges are only
+    # present if they have data
     #
-    def patch_daily_mobility(self, mobility_data):
-        if mobility_data is None:
-            return None
-        last_valid_value = None
-        # Find the first mobility data
-        first_title_with_mobility = None
-        for date_title in get_date_titles(self.start_date_title, self.end_date_title):
-            if date_title in mobility_data:
-                last_valid_value = mobility_data[date_title]
-                first_title_with_mobility = date_title
-                break
-        for date_title in get_date_titles(self.start_date_title, self.end_date_title):
-            if date_title in mobility_data:
-                last_valid_value = mobility_data[date_title]
-            else:
-                mobility_data[date_title] = last_valid_value
-        # Patch mobility for days_to_predict with latest_valid_value
-        for date_title in get_date_titles(
-            self.end_date_title,
-            get_title_future_or_past(self.end_date_title, self.days_to_predict),
-        ):
-            mobility_data[date_title] = last_valid_value
-        sorted_mobility_data = {
-            k: mobility_data[k] for k in sorted(mobility_data.keys())
-        }
-        return {
-            k: mobility_data[k]
-            for k in sorted(
-                mobility_data.keys(), key=lambda title: get_date_from_title(title)
-            )
-        }
+    def patch_daily_mobility(self, values):
+        present = ~np.isnan(values)
+        history = slice(
+            self.start_day - self.first_day, self.end_day - self.first_day + 1
+        )
+        valid = present[:, history]
+        columns = np.arange(valid.shape[1])
+        # Column of last seen value, or of the first value for columns before it
+        last_seen = np.maximum.accumulate(np.where(valid, columns, -1), axis=1)
+        first_seen = np.argmax(valid, axis=1)
+        last_seen = np.where(last_seen < 0, first_seen[:, None], last_seen)
+        patched = values.copy()
+        patched[:, history] = np.take_along_axis(values[:, history], last_seen, axis=1)
+        # Fips without any data in history have None values
+        patched[~valid.any(axis=1), history] = np.nan
+        future = slice(history.stop - 1, history.stop + self.days_to_predict)
+        patched[:, future] = patched[:, history.stop - 1 : history.stop]
+        present[:, history.start : future.stop] = True
+        return (patched, present)
 
     def parse(self):
-        # Update us mobility-time_series
-        data_us = self.data["US"]["0"]
-        data_us["mobility"]["time_series"] = self.get_us_m50_index()
+        self.load()
+        # Us, and states, which are also us[mobility][date_title][state_fips],
+        # then counties, which have been added to self.data by confirmed/deaths
+        # parsing. Counties without data share the series of their states
+        fips = ["0"]
+        fallback = {}  # state fips -> counties without data
         for state_fips in state_fips_iterator():
-            # Update state mobility-timeseries
-            mobility_state = self.get_m50_index(state_fips)
-            data_state = self.data["US"][state_fips]
-            data_state["mobility"]["time_series"] = mobility_state
-            # Update us[mobility][date_title][state_fips]
-            for date_title in mobility_state:
-                mobility_data_daily = data_us["mobility"].setdefault(date_title, {})
-                mobility_data_daily[state_fips] = mobility_state[date_title]
-            # data_state['names'] should have been set, call confirmed/deaths parsing before mobility parsing
-            for county_fips in data_state["names"]:
-                if len(county_fips) != 5 or not county_fips.isdigit():
-                    continue
-                mobility_county = self.get_m50_index(county_fips)
-                data_state[county_fips]["mobility"] = mobility_county
-                for date_title in mobility_county:
-                    mobility_data_daily = data_state["mobility"].setdefault(
-                        date_title, {}
-                    )
-                    mobility_data_daily[county_fips] = mobility_county[date_title]
-
-
-def format_date_title(descartes_date):
-    return get_title_from_date(_get_date_from_descarte_title(descartes_date))
-
-
-def _get_date_from_descarte_title(title):
-    assert title is not None
-    (yyyy, mm, dd) = title.split("-")
-    assert yyyy is not None and mm is not None and dd is not None
-    return date(int(yyyy), int(mm.lstrip("0")), int(dd.lstrip("0")))
-
-
-def _get_us_weighted_average(fips_data_map):
-    us_weighted_values = {}  # date_title -> sum of weighted values
-    us_total_weight = {}  # data_title -> subm of weights
-    us_population = united_states["population"]
-    for fips_state in state_fips_iterator():
-        weight = fips_state_map[fips_state]["population"] / us_population
-        state_data = fips_data_map[fips_state]
-        for date_title in state_data:
-            total_weighted_values = us_weighted_values.setdefault(date_title, 0)
-            us_weighted_values[date_title] = (
-                total_weighted_values + state_data[date_title] * weight
-            )
-            total_weight = us_total_weight.setdefault(date_title, 0)
-            us_total_weight[date_title] = total_weight + weight
-    return {
-        k: round(us_weighted_values[k] / us_total_weight[k]) for k in us_weighted_values
-    }
+            fips.append(state_fips)
+            for county_fips in self.data.child_fips(state_fips):
+                if county_fips in self.fips_rows:
+                    fips.append(county_fips)
+                else:
+                    fallback.setdefault(state_fips, []).append(county_fips)
+        fips = [x for x in fips if self._get_row(x) is not None]
+        rows = [self.fips_rows[x] for x in fips]
+        self.data.set_series(
+            "mobility",
+            fips,
+            self.first_day,
+            self.m50_index[rows],
+            self.m50_index_present[rows],
+        )
+        for (state_fips, counties) in fallback.items():
+            if state_fips in self.fips_rows:
+                self.data.share_series("mobility", counties, state_fips)
+
+
+def _get_mobility_array(values):
+    return np.array([np.nan if x is None else x for x in values], dtype=np.float64)
+
+
+def get_weighted_average(values, weights, groups, num_groups):
+    # (num_groups, days) averages of (regions, days) values weighted by
+    # weights of regions, regions being in groups[region]. NaN values are
+    # missing, averages of a day are over the regions with values, NaN if
+    # none has. Sums are made in region order, as a loop over regions would
+    present = ~np.isnan(values)
+    weights = np.where(present, weights[:, None], 0)
+    weighted_values = np.zeros((num_groups, values.shape[1]))
+    total_weights = np.zeros((num_groups, values.shape[1]))
+    np.add.at(weighted_values, groups, np.where(present, values, 0) * weights)
+    np.add.at(total_weights, groups, weights)
+    with np.errstate(invalid="ignore"):
+        return weighted_values / total_weights
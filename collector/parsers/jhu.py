@@ -1,11 +1,5 @@
-import csv
-from datetime import date, timedelta
-from ..utils import (
-    get_date_from_title,
-    get_title_from_date,
-    get_date_titles,
-    parse_int,
-)
+import numpy as np
+from ..data_cube import LEGEND_DEFAULTS, json_int, json_number
 from ..us import (
     state_fips_iterator,
     split_county_fips,
@@ -16,7 +10,7 @@ from .covid_parser import CovidParser
 
 
 class JhuParser(CovidParser):
-    def __init__(self, data, data_source_folder):
+    def __init__(self, data, data_source_folder, previous=None, revision_window=None):
         super().__init__(data, data_source_folder)
         jhu_data_folder = f"{data_source_folder}/COVID-19/csse_covid_19_data/csse_covid_19_time_series"
         self.lookup_table_file = f"{jhu_data_folder}/../UID_ISO_FIPS_LookUp_Table.csv"
@@ -32,69 +26,66 @@ class JhuParser(CovidParser):
         self.raw_global_data_file_deaths = (
             f"{jhu_data_folder}/time_series_covid19_deaths_global.csv"
         )
-        self.headers_us_time_series_confirmed = []
-        self.headers_us_time_series_deaths = []
+        # JhuUsTimeSeries loaded once by parse_us, shared by all passes over counties
+        self.time_series = None
+        # state fips -> {county name hash -> county fips}
+        self.county_name_hashes = {}
         self.headers_global_time_series_confirmed = []
         self.headers_global_time_series_deaths = []
         # least_recent_date, most_recent_date, date_keys_history are the same between us and global
         self.least_recent_date = "1/22/20"
         self.most_recent_date = ""  # In m/dd/yy, just like in JHU dataset
+        # Day offsets of least/most_recent_date in self.calendar
+        self.least_recent_day = self.calendar.day(self.least_recent_date)
+        self.most_recent_day = None
         self.date_keys_history = []
-        # To be inited after loading headers->least/most_recent_date
+        # To be inited after loading time series->least/most_recent_date
         self.special_counties = None
+        # DataCube of the last mesh. If set, states, us and legends are only
+        # calculated for days from the first day with revised county data,
+        # unless more than the last revision_window days were revised
+        self.previous = previous
+        self.revision_window = revision_window
 
-    def set_headers_us(self, headers_us_line_confirmed, headers_us_line_deaths):
-        self.headers_us_time_series_confirmed = self.partition_csv_line(
-            headers_us_line_confirmed
-        )
-        self.headers_us_time_series_deaths = self.partition_csv_line(
-            headers_us_line_deaths
-        )
-        header_length_confirmed = len(self.headers_us_time_series_confirmed)
-        self.most_recent_date = self.headers_us_time_series_confirmed[
-            header_length_confirmed - 1
-        ]
-        self.date_keys_history = get_date_titles(
-            self.least_recent_date, self.most_recent_date
+    def get_source_files(self):
+        return [self.raw_us_data_file_confirmed, self.raw_us_data_file_deaths]
+
+    def load_us_time_series(self):
+        self.time_series = JhuUsTimeSeries(self.calendar)
+        self.time_series.load(
+            self.raw_us_data_file_confirmed, self.raw_us_data_file_deaths
         )
-        end_date = get_date_from_title(self.most_recent_date)
-        self.special_counties = SpecialCounties(
-            get_date_from_title(self.least_recent_date),
-            get_date_from_title(self.most_recent_date),
+        assert self.time_series.first_day == self.least_recent_day
+        self.most_recent_day = self.time_series.last_day
+        self.most_recent_date = self.calendar.title(self.most_recent_day)
+        self.date_keys_history = self.calendar.titles(
+            self.least_recent_day, self.most_recent_day
         )
+        self.special_counties = SpecialCounties()
+        self.data.set_history(self.least_recent_day, self.most_recent_day)
+        self.data.add_series("confirmed", np.int32, json_int)
+        self.data.add_series("deaths", np.int32, json_int)
+        self.data.add_series("mobility", np.float64, json_number)
         print(f"Most recent date is {self.most_recent_date}")
 
-    def parse_line_us(self, headers, line):
-        d = dict(zip(headers, self.partition_csv_line(line),))
-        format_us_county_data(d)
-        return d
-
-    def _get_default_data_root_us(self):
-        return {
-            "least_recent_date": self.least_recent_date,
-            "most_recent_date": self.most_recent_date,
-            "confirmed": {"time_series": {},},
-            "deaths": {"time_series": {},},
-            "mobility": {"time_series": {},},
-            "population": {},
-            "names": {},  # key is state or county fips, value is name
-            "hashes": {},  # key is a hash of full name, value is fips, only used for counties in state data
-        }
+    def _add_region_root_us(self, fips):
+        # Roots, i.e. us and states, have confirmed, deaths and mobility blocks
+        # in their json data
+        row = self.data.add_region(fips)
+        for case_type in ("confirmed", "deaths", "mobility"):
+            self.data.series[case_type].declared[row] = True
+        return row
 
     def process_us_county_data(self, county_data):
-        county_data_confirmed = county_data["confirmed"]
-        county_data_deaths = county_data["deaths"]
-        assert county_data_confirmed["FIPS"] == county_data_deaths["FIPS"]
         # For counties reported within a healthcare region, distribute regional to counties
         self.special_counties.update_county_data(county_data)
-        fips = county_data_confirmed["FIPS"]
+        fips = county_data["FIPS"]
         (state_fips, county_fips) = split_county_fips(fips)
-        data_us = self.data["US"].setdefault("0", self._get_default_data_root_us())
-        data_state = self.data["US"].setdefault(
-            state_fips, self._get_default_data_root_us()
-        )
-        county_population = int(county_data_deaths["Population"])
-        county_name = county_data_deaths["Admin2"]
+        self._add_region_root_us("0")
+        state_row = self._add_region_root_us(state_fips)
+        row = self.data.add_region(fips)
+        county_population = int(county_data["Population"])
+        county_name = county_data["Admin2"]
         county_name_hash = (
             _get_us_county_name_hash(county_name)
             if county_name is not None
@@ -102,174 +93,190 @@ class JhuParser(CovidParser):
             and not county_name.startswith("Out of ")
             else -1
         )
-        state_name = county_data_deaths["Province_State"]
-        # No roll up for county data, therefore no need for a separtae time_series
-        data_county = data_state.setdefault(
-            fips,
-            {
-                "least_recent_date": self.least_recent_date,
-                "most_recent_date": self.most_recent_date,
-                "confirmed": {
-                    x: parse_int(county_data_confirmed[x])
-                    for x in self.date_keys_history
-                },
-                "deaths": {
-                    x: parse_int(county_data_deaths[x]) for x in self.date_keys_history
-                },
-                "population": county_population,
-                "name": county_name,
-                "hash": county_name_hash,
-            },
-        )
-        data_us["population"].setdefault(state_fips, 0)
-        data_us["population"][state_fips] += county_population
-        if not state_fips in data_us["names"]:
-            data_us["names"][state_fips] = state_name
-        data_state["population"].setdefault(fips, 0)
-        data_state["population"][fips] += county_population
-        data_state["names"][fips] = county_name
-        if county_name_hash > 0 and county_name_hash in data_state["hashes"]:
-            current_county_name = data_state["names"][
-                data_state["hashes"][county_name_hash]
+        state_name = county_data["Province_State"]
+        self.data.populations[state_row] += county_population
+        if self.data.names[state_row] is None:
+            self.data.names[state_row] = state_name
+        self.data.populations[row] += county_population
+        self.data.names[row] = county_name
+        self.data.hashes[row] = county_name_hash
+        # key is a hash of full name, value is fips, only used for counties in state data
+        state_hashes = self.county_name_hashes.setdefault(state_fips, {})
+        if county_name_hash > 0 and county_name_hash in state_hashes:
+            current_county_name = self.data.names[
+                self.data.rows[state_hashes[county_name_hash]]
             ]
             assert county_name == current_county_name or print(
-                f'Hash Conflict: {county_name} and {data_state["names"][data_state["hashes"][county_name_hash]]}'
-            )
-        data_state["hashes"][county_name_hash] = fips
-
-        def update_us_and_state(case_type, num_cases):
-            def get_default_cases():
-                return {
-                    "minCases": 1000000,
-                    "maxCases": -1,
-                    "minPerCapita": 100000000,
-                    "maxPerCapita": -1,
-                }
-
-            data_us[case_type]["time_series"].setdefault(d, 0)
-            data_us[case_type]["time_series"][d] += num_cases
-            data_us[case_type].setdefault(d, get_default_cases())
-            data_us[case_type][d].setdefault(state_fips, 0)
-            data_us[case_type][d][state_fips] += num_cases
-            data_state[case_type].setdefault(d, get_default_cases())
-            data_state[case_type][d][fips] = num_cases
-            if county_fips not in ("800", "900", "888", "999"):
-                # Only consider min/maxCases for regular counties
-                if data_state[case_type][d]["minCases"] > num_cases:
-                    data_state[case_type][d]["minCases"] = num_cases
-                if data_state[case_type][d]["maxCases"] < num_cases:
-                    data_state[case_type][d]["maxCases"] = num_cases
-            data_state[case_type]["time_series"].setdefault(d, 0)
-            data_state[case_type]["time_series"][d] += num_cases
-
-        for d in self.date_keys_history:
-            update_us_and_state(
-                "confirmed", parse_int(county_data_confirmed.get(d, "0"))
+                f"Hash Conflict: {county_name} and {current_county_name}"
             )
-            update_us_and_state("deaths", parse_int(county_data_deaths.get(d, "0")))
+        state_hashes[county_name_hash] = fips
+        # No roll up for county data, states and us are rolled up after all counties
+        columns = self.data.columns(self.least_recent_day, self.most_recent_day)
+        for case_type in ("confirmed", "deaths"):
+            series = self.data.series[case_type]
+            series.values[row, columns] = county_data[case_type]
+            series.present[row, columns] = True
+            series.declared[row] = True
 
     def process_jhu_data_files(self, county_data_processor):
-        with open(self.raw_us_data_file_confirmed) as fp_confirmed, open(
-            self.raw_us_data_file_deaths
-        ) as fp_deaths:
-            # Skip the first header line
-            line_confirmed = fp_confirmed.readline()
-            line_deaths = fp_deaths.readline()
-            all_parsed_line_deaths = {}
-            while line_deaths:
-                line_deaths = fp_deaths.readline()
-                parsed_line_deaths = self.parse_line_us(
-                    self.headers_us_time_series_deaths, line_deaths
-                )
-                if not "UID" in parsed_line_deaths:
-                    print(f"Ignoring deaths line with no UID: {line_deaths}")
-                    continue
-                all_parsed_line_deaths[parsed_line_deaths["UID"]] = parsed_line_deaths
-            while line_confirmed:
-                line_confirmed = fp_confirmed.readline()
-                parsed_line_confirmed = self.parse_line_us(
-                    self.headers_us_time_series_confirmed, line_confirmed
-                )
-                if not "UID" in parsed_line_confirmed:
-                    print(f"Ignoring confirmed line with no UID: {line_confirmed}")
-                    continue
-                current_uid = parsed_line_confirmed["UID"]
-                parsed_line_deaths = all_parsed_line_deaths.get(current_uid, None)
-                if not parsed_line_deaths:
-                    print(f"Deaths line with UID {current_uid} not found.")
-                if parsed_line_confirmed["FIPS"].startswith("000"):
-                    print(
-                        f"Ignoring US territories for now. FIPS was {parsed_line_confirmed['FIPS']}"
-                    )
-                    continue
-                county_data_processor(
-                    {"confirmed": parsed_line_confirmed, "deaths": parsed_line_deaths}
-                )
+        # One pass over counties in self.time_series, which has been loaded
+        # once. Processors may update confirmed/deaths arrays in place.
+        for county_data in self.time_series.iter_county_data():
+            county_data_processor(county_data)
 
     def parse_us(self):
-        # Set headers_us from
-        with open(self.raw_us_data_file_confirmed) as fp_confirmed, open(
-            self.raw_us_data_file_deaths
-        ) as fp_deaths:
-            line_confirmed = fp_confirmed.readline()
-            line_deaths = fp_deaths.readline()
-            self.set_headers_us(line_confirmed, line_deaths)
+        # Read in JHU county time series data, set least/most_recent_date
+        self.load_us_time_series()
         # Proprocess JHU county time series data, fill self.special_counties
         self.process_jhu_data_files(self.special_counties.preprocess_county_data)
-        # Read in and process JHU county time series data
+        # Process JHU county time series data
         self.process_jhu_data_files(self.process_us_county_data)
-        # Go through data_us["0"]['confirmed'][by_date], each date, set 'minCases' and 'maxCases'
-        for d in self.date_keys_history:
-            for case_type in ("confirmed", "deaths"):
-                data_us_daily = self.data["US"]["0"][case_type][d]
-                population = self.data["US"]["0"]["population"]
-                for fips in state_fips_iterator():
-                    if data_us_daily["maxCases"] < data_us_daily[fips]:
-                        data_us_daily["maxCases"] = data_us_daily[fips]
-                    if data_us_daily["minCases"] > data_us_daily[fips]:
-                        data_us_daily["minCases"] = data_us_daily[fips]
-                    casesPerCapita = int(
-                        data_us_daily[fips] / population[fips] * pow(10, 6)
-                    )
-                    if data_us_daily["maxPerCapita"] < casesPerCapita:
-                        data_us_daily["maxPerCapita"] = casesPerCapita
-                    if data_us_daily["minPerCapita"] > casesPerCapita:
-                        data_us_daily["minPerCapita"] = casesPerCapita
-        for k in state_fips_iterator():
-            if not (len(k) == 2 and k.isdigit()):
-                continue
-            data_state = self.data["US"][k]
-            state_fips = k
-            population = data_state["population"]
-            for case_type in ("confirmed", "deaths"):
-                for d in self.date_keys_history:
-                    data_state_daily = data_state[case_type][d]
-                    for county_fips in data_state_daily:
-                        if not (len(county_fips) == 5 and county_fips.isdigit()):
-                            continue
-                        if (
-                            county_fips in ("99999", "88888")
-                            or county_fips.startswith("800")
-                            or county_fips.startswith("900")
-                        ):
-                            continue
-                        if (
-                            int(county_fips) % 1000 < 600
-                            and int(county_fips) % 1000 >= 555
-                        ):
-                            # Made up regions
-                            continue
-                        casesPerCapita = int(
-                            data_state_daily[county_fips]
-                            / population[county_fips]
-                            * pow(10, 6)
-                        )
-                        if data_state_daily["maxPerCapita"] < casesPerCapita:
-                            data_state_daily["maxPerCapita"] = casesPerCapita
-                        if data_state_daily["minPerCapita"] > casesPerCapita:
-                            data_state_daily["minPerCapita"] = casesPerCapita
+        first_day = self.get_first_revised_day()
+        self._copy_previous_days(first_day - 1)
+        legend_masks = self._get_legend_masks()
+        for case_type in ("confirmed", "deaths"):
+            self.data.roll_up(case_type, first_day, self.most_recent_day)
+            self.calculate_legends(case_type, first_day, *legend_masks)
         self.special_counties.verify_regional_data()
 
+    def get_first_revised_day(self):
+        # First day to calculate states, us and legends for. Drops
+        # self.previous if it is revised beyond self.revision_window
+        if self.previous is None:
+            return self.least_recent_day
+        first_day = self._get_first_revised_day(self.previous)
+        if first_day <= self.previous.most_recent_day - self.revision_window:
+            print(
+                f"JHU data revised since {self.calendar.title(first_day)}, "
+                "parsing all days"
+            )
+            self.previous = None
+            return self.least_recent_day
+        return first_day
+
+    def _get_first_revised_day(self, previous):
+        # First day with county data other than in previous, the day after
+        # the most recent day of previous if there is none
+        counties = [x for x in self.data.fips if len(x) == 5]
+        if (
+            previous.least_recent_day != self.least_recent_day
+            or previous.most_recent_day > self.most_recent_day
+            or set(counties) != {x for x in previous.fips if len(x) == 5}
+        ):
+            return self.least_recent_day
+        rows = np.array([self.data.rows[x] for x in counties], dtype=np.int64)
+        previous_rows = np.array([previous.rows[x] for x in counties], dtype=np.int64)
+        if (self.data.populations[rows] != previous.populations[previous_rows]).any():
+            return self.least_recent_day
+        last_day = previous.most_recent_day
+        revised = np.zeros(last_day - self.least_recent_day + 1, dtype=bool)
+        for case_type in ("confirmed", "deaths"):
+            values = self.data.series[case_type].values[
+                rows, self.data.columns(self.least_recent_day, last_day)
+            ]
+            previous_values = previous.series[case_type].values[
+                previous_rows, previous.columns(self.least_recent_day, last_day)
+            ]
+            revised |= (values != previous_values).any(axis=0)
+        if revised.any():
+            return self.least_recent_day + int(np.argmax(revised))
+        return last_day + 1
+
+    def _copy_previous_days(self, last_day):
+        # Rolled up states and us data up to last_day, from self.previous
+        if self.previous is None or last_day < self.least_recent_day:
+            return
+        rows = [i for (i, x) in enumerate(self.data.fips) if len(x) <= 2]
+        previous_rows = [self.previous.rows[self.data.fips[x]] for x in rows]
+        columns = self.data.columns(self.least_recent_day, last_day)
+        previous_columns = self.previous.columns(self.least_recent_day, last_day)
+        for case_type in ("confirmed", "deaths"):
+            series = self.data.series[case_type]
+            previous_series = self.previous.series[case_type]
+            series.values[rows, columns] = previous_series.values[
+                previous_rows, previous_columns
+            ]
+            series.present[rows, columns] = previous_series.present[
+                previous_rows, previous_columns
+            ]
+
+    def _get_legend_masks(self):
+        us_states = set(state_fips_iterator())
+        fips = self.data.fips
+        # Regular counties are considered for min/maxCases of their states
+        for_cases = np.array(
+            [
+                len(x) == 5
+                and split_county_fips(x)[1] not in ("800", "900", "888", "999")
+                for x in fips
+            ],
+            dtype=bool,
+        )
+        # Counties of states in state_fips_iterator, except made up regions,
+        # are considered for min/maxPerCapita of their states
+        for_per_capita = np.array(
+            [
+                len(x) == 5
+                and split_county_fips(x)[0] in us_states
+                and _is_county_with_per_capita(x)
+                for x in fips
+            ],
+            dtype=bool,
+        )
+        # States in state_fips_iterator are considered for us min/max
+        for_us = np.array([x in us_states for x in fips], dtype=bool)
+        return (for_cases, for_per_capita, for_us)
+
+    def calculate_legends(
+        self, case_type, first_day, for_cases, for_per_capita, for_us
+    ):
+        # Color scale legends, i.e. daily 'min/maxCases' and 'min/maxPerCapita'
+        # of counties in each state, and of states in us, from first_day on.
+        # Legends of days before first_day are taken from self.previous
+        num_regions = self.data.num_regions
+        columns = self.data.columns(first_day, self.most_recent_day)
+        cases = self.data.series[case_type].values[:num_regions, columns]
+        cases = cases.astype(np.int64)
+        population = self.data.populations[:num_regions]
+        parents = self.data.parents[:num_regions]
+        defaults = np.array(LEGEND_DEFAULTS, dtype=np.int64)[:, None]
+        legends = {
+            x: np.repeat(defaults, cases.shape[1], axis=1)
+            for x in self.data.fips
+            if len(x) <= 2
+        }
+        # Regions without population have no cases per capita
+        for_per_capita = for_per_capita & (population > 0)
+        for_us_per_capita = for_us & (population > 0)
+        # Index of min values in legends, max values follow
+        for (i, mask, values) in (
+            (0, for_cases, cases[for_cases]),
+            (0, for_us, cases[for_us]),
+            (
+                2,
+                for_per_capita,
+                _get_cases_per_capita(cases, population, for_per_capita),
+            ),
+            (
+                2,
+                for_us_per_capita,
+                _get_cases_per_capita(cases, population, for_us_per_capita),
+            ),
+        ):
+            groups = parents[mask]
+            for (group, min_values, max_values) in _min_max_by_group(values, groups):
+                legend = legends[self.data.fips[group]]
+                np.minimum(legend[i], min_values, out=legend[i])
+                np.maximum(legend[i + 1], max_values, out=legend[i + 1])
+        if first_day > self.least_recent_day:
+            previous_legends = self.previous.legends[case_type]
+            num_days = first_day - self.least_recent_day
+            legends = {
+                x: np.concatenate((previous_legends[x][:, :num_days], y), axis=1)
+                for (x, y) in legends.items()
+            }
+        self.data.legends[case_type] = legends
+
     def process_lookup_table(self):
         pass
 
@@ -281,6 +288,86 @@ class JhuParser(CovidParser):
         self.parse_global()
 
 
+class JhuUsTimeSeries:
+    """
+    JHU US confirmed and deaths time series as int32 (n_counties, n_days)
+    matrices. Rows of both matrices are aligned by UID, in the order of the
+    confirmed file, and described by one metadata dict per row. Column 0 is
+    day first_day of the calendar.
+    """
+
+    metadata_fields = (
+        "UID",
+        "FIPS",
+        "Admin2",
+        "Province_State",
+        "Combined_Key",
+        "Population",
+    )
+
+    def __init__(self, calendar):
+        self.calendar = calendar
+        self.first_day = None
+        self.last_day = None
+        self.metadata = []
+        self.confirmed = None
+        self.deaths = None
+
+    def load(self, confirmed_file, deaths_file):
+        (metadata_confirmed, days, matrix_confirmed) = self._read_csv(confirmed_file)
+        (metadata_deaths, days_deaths, matrix_deaths) = self._read_csv(deaths_file)
+        self.first_day = days[0]
+        self.last_day = days[-1]
+        # Population is only available in the deaths file
+        rows_deaths = {x["UID"]: i for (i, x) in enumerate(metadata_deaths)}
+        rows_confirmed = []
+        rows_aligned_deaths = []
+        for (i, metadata) in enumerate(metadata_confirmed):
+            uid = metadata["UID"]
+            if uid not in rows_deaths:
+                print(f"Deaths line with UID {uid} not found.")
+                continue
+            metadata = metadata_deaths[rows_deaths[uid]]
+            format_us_county_data(metadata)
+            if metadata["FIPS"].startswith("000"):
+                print(f"Ignoring US territories for now. FIPS was {metadata['FIPS']}")
+                continue
+            self.metadata.append(metadata)
+            rows_confirmed.append(i)
+            rows_aligned_deaths.append(rows_deaths[uid])
+        self.confirmed = self._align_days(days, matrix_confirmed[rows_confirmed])
+        self.deaths = self._align_days(days_deaths, matrix_deaths[rows_aligned_deaths])
+
+    def _read_csv(self, csv_file):
+        # Dates columns come after Combined_Key, or Population if present.
+        # Cells are sometimes 0.0, parse as float and truncate like parse_int
+        (titles, metadata, matrix) = CovidParser.read_csv_table(
+            csv_file, self.metadata_fields, ("Combined_Key", "Population"), np.float64
+        )
+        days = [self.calendar.day(x) for x in titles]
+        return (metadata, days, matrix.astype(np.int32))
+
+    def _align_days(self, days, matrix):
+        if days == list(range(self.first_day, self.last_day + 1)):
+            return matrix
+        aligned = np.zeros(
+            (matrix.shape[0], self.last_day - self.first_day + 1), dtype=np.int32
+        )
+        columns = [
+            i for (i, x) in enumerate(days) if self.first_day <= x <= self.last_day
+        ]
+        aligned[:, [days[i] - self.first_day for i in columns]] = matrix[:, columns]
+        return aligned
+
+    def iter_county_data(self):
+        for (i, metadata) in enumerate(self.metadata):
+            yield {
+                **metadata,
+                "confirmed": self.confirmed[i],
+                "deaths": self.deaths[i],
+            }
+
+
 def format_us_county_data(county_data_dict):
     fips = county_data_dict["FIPS"] if "FIPS" in county_data_dict else None
     combined_key = (
@@ -327,6 +414,36 @@ def format_us_county_data(county_data_dict):
     county_data_dict["FIPS"] = fips.zfill(5)
 
 
+def _is_county_with_per_capita(county_fips):
+    if (
+        county_fips in ("99999", "88888")
+        or county_fips.startswith("800")
+        or county_fips.startswith("900")
+    ):
+        return False
+    # Made up regions
+    return not 555 <= int(county_fips) % 1000 < 600
+
+
+def _get_cases_per_capita(cases, population, mask):
+    return (cases[mask] / population[mask][:, None] * pow(10, 6)).astype(np.int64)
+
+
+def _min_max_by_group(values, groups):
+    # Yields (group, min of rows, max of rows) for rows of values in each group
+    if len(groups) == 0:
+        return
+    (unique_groups, inverse) = np.unique(groups, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    starts = np.searchsorted(inverse[order], np.arange(len(unique_groups)))
+    values = values[order]
+    yield from zip(
+        unique_groups.tolist(),
+        np.minimum.reduceat(values, starts, axis=0),
+        np.maximum.reduceat(values, starts, axis=0),
+    )
+
+
 def _get_us_county_name_hash(county_name):
     # A sevent digit integer,
     assert county_name is not None and len(county_name) > 2
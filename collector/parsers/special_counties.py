@@ -1,19 +1,17 @@
 # TODO Use regional_data to somehow show bayarea cases, NYC cases, greater LA cases etc.
-from datetime import timedelta
-import math
 from copy import deepcopy
 from itertools import groupby
-from ..utils import date_range, get_title_from_date, parse_int
+import numpy as np
+from ..utils import parse_int
 from ..us import new_york_county_population
 
 
 class SpecialCounties:
-    def __init__(self, start_date, end_date):
+    def __init__(self):
         self.populations = {}
-        # key is region fips, value is {"confirmed":{}, "deaths": {}}
+        # key is region fips, value is county data of the region, with
+        # "confirmed" and "deaths" arrays of daily cases
         self.regional_data = {}
-        self.start_date = start_date
-        self.end_date = end_date
         self.region_fips = {
             "25007": "25555",
             "25019": "25555",
@@ -82,7 +80,7 @@ class SpecialCounties:
             return
         region_fips = self.region_fips[fips]
         county_fips = fips
-        county_population = parse_int(county_data["deaths"]["Population"])
+        county_population = parse_int(county_data["Population"])
         if county_fips == "36061":
             # Make sure NY county population has been corrected.
             # JHU dataset has wrong population os 5M
@@ -120,34 +118,23 @@ class SpecialCounties:
                 key_counties_remaining, len(self.child_fips[region_fips])
             )
             regional_data[key_counties_remaining] = counties_remaining - 1
-            for d in date_range(self.start_date, self.end_date + timedelta(1)):
-                date_title = get_title_from_date(d)
-                if date_title in regional_data[case_type]:
-                    regional_cases = parse_int(regional_data[case_type][date_title])
-                    county_cases = (
-                        parse_int(county_data[case_type][date_title])
-                        if date_title in county_data
-                        else 0
-                    )
-                    if regional_cases > 0:
-                        regional_data.setdefault(key_cases_remaining, {})
-                        cases_remaining = parse_int(
-                            regional_data[key_cases_remaining].setdefault(
-                                date_title, regional_cases
-                            )
-                        )
-                        weighted = math.floor(
-                            regional_cases * county_population / regional_population
-                        )
-                        cases_remaining -= weighted
-                        if counties_remaining == 1:
-                            # Last county in this region, give all remaining cases caused by rounding error to the last county
-                            weighted += cases_remaining
-                            cases_remaining = 0
-                        county_data[case_type][
-                            date_title
-                        ] = f"{county_cases + weighted}"
-                        regional_data[key_cases_remaining][date_title] = cases_remaining
+            regional_cases = regional_data[case_type].astype(np.int64)
+            # Only distribute on dates with regional cases
+            has_regional_cases = regional_cases > 0
+            if not has_regional_cases.any():
+                continue
+            cases_remaining = regional_data.setdefault(
+                key_cases_remaining, regional_cases.copy()
+            )
+            weighted = np.floor(
+                regional_cases * county_population / regional_population
+            ).astype(np.int64)
+            cases_remaining -= np.where(has_regional_cases, weighted, 0)
+            if counties_remaining == 1:
+                # Last county in this region, give all remaining cases caused by rounding error to the last county
+                weighted += cases_remaining
+                cases_remaining[has_regional_cases] = 0
+            county_data[case_type][has_regional_cases] = weighted[has_regional_cases]
 
     def verify_regional_data(self):
         for case_type in ["confirmed", "deaths"]:
@@ -160,20 +147,14 @@ class SpecialCounties:
                 ), f"{key_counties_remaining} for FIPS {fips} was {parent_data[key_counties_remaining]}"
                 if key_cases_remaining not in parent_data:
                     print(
-                        f"No {case_type} cases in fips {fips} {parent_data[case_type]['Combined_Key']}"
+                        f"No {case_type} cases in fips {fips} {parent_data['Combined_Key']}"
                     )
-                else:
-                    for d in date_range(self.start_date, self.end_date):
-                        date_title = get_title_from_date(d)
-                        if date_title in parent_data[key_cases_remaining]:
-                            parent_data[key_cases_remaining][date_title] == 0
 
 
 def get_fips_from_county_data(county_data):
     assert county_data is not None
     assert "confirmed" in county_data and "deaths" in county_data
-    assert county_data["confirmed"]["FIPS"] == county_data["deaths"]["FIPS"]
-    return county_data["confirmed"]["FIPS"]
+    return county_data["FIPS"]
 
 
 def _get_key_counties_remaining(case_type):
@@ -0,0 +1,58 @@
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+
+# Ways of making predictions of regions add up to those of their parents:
+# "bottom_up" sums predictions of bottom regions, without children, "ols"
+# and "wls" take the coherent predictions closest to those of all regions by
+# least squares, wls weighting regions by the inverse of their number of
+# bottom regions (MinT with structural scaling)
+RECONCILIATION_METHODS = ("bottom_up", "ols", "wls")
+
+
+def summing_matrix(parents):
+    # (summing matrix, bottom rows) of the hierarchy of rows with parent row
+    # parents[row], -1 for the top. summing matrix[row, column] is 1 where
+    # row is bottom rows[column] or one of its ancestors
+    parents = np.asarray(parents, dtype=np.int64)
+    is_bottom = np.ones(len(parents), dtype=bool)
+    is_bottom[parents[parents >= 0]] = False
+    bottoms = np.flatnonzero(is_bottom)
+    (rows, columns) = ([], [])
+    (ancestors, ancestor_columns) = (bottoms, np.arange(len(bottoms)))
+    while len(ancestors):
+        rows.append(ancestors)
+        columns.append(ancestor_columns)
+        has_parent = parents[ancestors] >= 0
+        ancestors = parents[ancestors[has_parent]]
+        ancestor_columns = ancestor_columns[has_parent]
+    rows = np.concatenate(rows)
+    summing = scipy.sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, np.concatenate(columns))),
+        shape=(len(parents), len(bottoms)),
+    )
+    return (summing, bottoms)
+
+
+def reconcile(predictions, summing, bottoms, method):
+    """
+    Predictions of bottom rows, (bottom rows, columns), reconciled from
+    (rows, columns) predictions of all rows by method, see
+    RECONCILIATION_METHODS. summing @ bottom predictions are coherent
+    predictions of all rows, for all columns at once.
+    """
+    assert method in RECONCILIATION_METHODS or print(f"No such method {method}")
+    if method == "bottom_up":
+        return predictions[bottoms]
+    # (S' W S)^-1 S' W predictions, S the summing matrix and W the diagonal
+    # of the weights of rows. S' W S is positive definite, S having a row of
+    # every bottom row
+    if method == "ols":
+        weights = np.ones(summing.shape[0])
+    else:
+        weights = 1 / np.asarray(summing.sum(axis=1))[:, 0]
+    weighted = scipy.sparse.csr_matrix(summing.T.multiply(weights[None, :]))
+    normal = (weighted @ summing).toarray()
+    return scipy.linalg.cho_solve(
+        scipy.linalg.cho_factor(normal), weighted @ predictions
+    )
@@ -0,0 +1,59 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonSerializer:
+    """
+    Serializes json data of regions to utf-8 bytes with the json module.
+    Data is indented by indent spaces, or written without whitespace if
+    indent is None.
+    """
+
+    name = "json"
+
+    @staticmethod
+    def is_available():
+        return True
+
+    def dumps(self, data, indent=None):
+        separators = None if indent else (",", ":")
+        return json.dumps(
+            data, ensure_ascii=False, indent=indent, separators=separators
+        ).encode("utf-8")
+
+
+class OrjsonSerializer(JsonSerializer):
+    """
+    Serializes json data of regions with orjson, which only indents by 2
+    spaces. Int keys, such as county name hashes, are written as strings
+    like the json module does.
+    """
+
+    name = "orjson"
+
+    @staticmethod
+    def is_available():
+        return orjson is not None
+
+    def dumps(self, data, indent=None):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+
+
+# Fastest first
+SERIALIZERS = {x.name: x for x in (OrjsonSerializer, JsonSerializer)}
+
+
+def get_serializer(name="json"):
+    # Serializer by name, "auto" for the fastest one installed
+    if name == "auto":
+        name = next(x for (x, y) in SERIALIZERS.items() if y.is_available())
+    serializer = SERIALIZERS[name]
+    assert serializer.is_available() or print(f"Serializer {name} not installed")
+    return serializer()
@@ -1,13 +1,122 @@
 from datetime import date, timedelta, datetime
 
+# Day 0 of the calendar, the least recent date in the JHU time series
+CALENDAR_EPOCH = date(2020, 1, 22)
+
+
+class Calendar:
+    """
+    Maps m/d/yy date titles to integer day offsets from CALENDAR_EPOCH.
+
+    Every title is formatted once and interned in a table, so converting
+    between days and titles, or stepping to yesterday/tomorrow, is a list
+    index or a dict lookup instead of a strptime/strftime round trip.
+    Days before the epoch are negative.
+    """
+
+    # Number of days the title table grows by when it runs out of titles
+    block_size = 64
+
+    def __init__(self, epoch=CALENDAR_EPOCH):
+        self.epoch = epoch
+        self._first_day = 0
+        self._titles = []
+        # title -> day, also caches non-canonical titles such as 03/01/20
+        self._days = {}
+        # yyyymmdd -> day
+        self._days_yyyymmdd = {}
+        # yyyy-mm-dd -> day
+        self._days_iso = {}
+
+    def _extend(self, day):
+        # Grow the title table by whole blocks until it includes day
+        first_day = self._first_day
+        last_day = first_day + len(self._titles) - 1
+        if len(self._titles) == 0:
+            (first_day, last_day) = (day, day - 1)
+        block_start = day - day % self.block_size
+        new_first_day = min(first_day, block_start)
+        new_last_day = max(last_day, block_start + self.block_size - 1)
+        head = [self._format_title(x) for x in range(new_first_day, first_day)]
+        tail = [self._format_title(x) for x in range(last_day + 1, new_last_day + 1)]
+        self._titles = head + self._titles + tail
+        self._first_day = new_first_day
+        self._days.update(zip(head, range(new_first_day, first_day)))
+        self._days.update(zip(tail, range(last_day + 1, new_last_day + 1)))
+
+    def _format_title(self, day):
+        return self.date(day).strftime("%-m/%-d/%y")
+
+    def day(self, title):
+        assert title is not None
+        day = self._days.get(title)
+        if day is None:
+            day = self.day_from_date(datetime.strptime(title, "%m/%d/%y").date())
+            self._extend(day)
+            self._days[title] = day
+        return day
+
+    def day_from_date(self, d):
+        if isinstance(d, datetime):
+            d = d.date()
+        return (d - self.epoch).days
+
+    def day_from_yyyymmdd(self, yyyymmdd):
+        assert yyyymmdd is not None
+        day = self._days_yyyymmdd.get(yyyymmdd)
+        if day is None:
+            day = self.day_from_date(get_date_from_yyyymmdd(yyyymmdd))
+            self._days_yyyymmdd[yyyymmdd] = day
+        return day
+
+    def day_from_iso(self, iso_date):
+        assert iso_date is not None
+        day = self._days_iso.get(iso_date)
+        if day is None:
+            day = self.day_from_date(date.fromisoformat(iso_date))
+            self._days_iso[iso_date] = day
+        return day
+
+    def date(self, day):
+        return self.epoch + timedelta(day)
+
+    def title(self, day):
+        i = day - self._first_day
+        if i < 0 or i >= len(self._titles):
+            self._extend(day)
+            i = day - self._first_day
+        return self._titles[i]
+
+    # Titles of days first_day to last_day, both inclusive
+    def titles(self, first_day, last_day):
+        if last_day < first_day:
+            return []
+        self.title(first_day)
+        self.title(last_day)
+        return self._titles[
+            first_day - self._first_day : last_day - self._first_day + 1
+        ]
+
+    def title_future_or_past(self, title, diff_days):
+        return self.title(self.day(title) + diff_days)
+
+    def title_yesterday(self, title):
+        return self.title(self.day(title) - 1)
+
+    def title_tomorrow(self, title):
+        return self.title(self.day(title) + 1)
+
+
+default_calendar = Calendar()
+
 
 def get_title_from_date(d):
-    return d.strftime("%-m/%-d/%y")
+    return default_calendar.title(default_calendar.day_from_date(d))
 
 
 def get_date_from_title(title):
     assert title is not None
-    return datetime.strptime(title, "%m/%d/%y").date()
+    return default_calendar.date(default_calendar.day(title))
 
 
 def get_date_from_yyyymmdd(yyyymmdd):
@@ -17,28 +126,24 @@ def get_date_from_yyyymmdd(yyyymmdd):
 
 def get_title_from_yyyymmdd(yyyymmdd):
     assert yyyymmdd is not None
-    return get_title_from_date(get_date_from_yyyymmdd(yyyymmdd))
+    return default_calendar.title(default_calendar.day_from_yyyymmdd(yyyymmdd))
 
 
 def get_date_titles(start_date_title, end_date_title):
-    start_date = get_date_from_title(start_date_title)
-    end_date = get_date_from_title(end_date_title)
-    return [
-        get_title_from_date(start_date + timedelta(x))
-        for x in range(int((end_date - start_date).days + 1))
-    ]
+    return default_calendar.titles(
+        default_calendar.day(start_date_title), default_calendar.day(end_date_title)
+    )
 
 
 def get_date_titles_with_future(start_date_title, end_date_title, days_to_predict):
-    return get_date_titles(
-        start_date_title,
-        get_title_from_date(get_date_from_title(end_date_title) + days_to_predict),
+    return default_calendar.titles(
+        default_calendar.day(start_date_title),
+        default_calendar.day(end_date_title) + days_to_predict,
     )
 
 
 def get_title_future_or_past(current_date_title, diff_days):
-    d = get_date_from_title(current_date_title)
-    return get_title_from_date(d + timedelta(diff_days))
+    return default_calendar.title_future_or_past(current_date_title, diff_days)
 
 
 def get_title_yesterday(current_date_title):
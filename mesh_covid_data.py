@@ -1,7 +1,104 @@
 #!/usr/bin/env python
 
+import argparse
 from collector import CovidMesher
+from collector.data_dumper import OUTPUT_PROFILES
+from collector.covid_predictor import PREDICTION_ENGINES
+from collector.reconciliation import RECONCILIATION_METHODS
+from collector.serializers import SERIALIZERS
 
 if __name__ == "__main__":
-    covidMesher = CovidMesher("../covid-data-sources", "./data/covid")
-    covidMesher.mesh()
+    parser = argparse.ArgumentParser(description="Mesh covid data into json files")
+    parser.add_argument("--source", default="../covid-data-sources")
+    parser.add_argument("--target", default="./data/covid")
+    parser.add_argument(
+        "--checkpoint",
+        default="./data/checkpoint.npz",
+        help="Data of the last mesh, written by every mesh, read by --incremental",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process new or revised data since the last mesh",
+    )
+    parser.add_argument(
+        "--revision-window",
+        type=int,
+        default=7,
+        help="Mesh all data if more recent days than this have been revised",
+    )
+    parser.add_argument(
+        "--dump-workers",
+        type=int,
+        default=None,
+        help="Number of workers writing json files, one per cpu by default",
+    )
+    parser.add_argument(
+        "--dump-threads",
+        action="store_true",
+        help="Write json files with threads instead of processes",
+    )
+    parser.add_argument(
+        "--output-profile",
+        choices=OUTPUT_PROFILES,
+        default="pretty",
+        help="compact writes minified json with precompressed .gz/.br siblings",
+    )
+    parser.add_argument(
+        "--serializer",
+        choices=["auto", *SERIALIZERS],
+        default="json",
+        help="Json encoder, auto for the fastest one installed",
+    )
+    parser.add_argument(
+        "--no-bundle",
+        action="store_true",
+        help="Do not write us.bundle, all data in one memory-mappable file",
+    )
+    parser.add_argument(
+        "--predict",
+        action="store_true",
+        help="Predict confirmed and deaths cases of the next days",
+    )
+    parser.add_argument(
+        "--predict-workers",
+        type=int,
+        default=None,
+        help="Number of processes fitting predictions, one per cpu by default",
+    )
+    parser.add_argument(
+        "--predict-engine",
+        choices=PREDICTION_ENGINES,
+        default="logit",
+        help="growth fits logistic growth curves of all regions at once",
+    )
+    parser.add_argument(
+        "--prediction-cache",
+        default="./data/prediction_cache.json",
+        help="Predictions of the last mesh, only regions with new data are fitted",
+    )
+    parser.add_argument(
+        "--reconcile-predictions",
+        choices=RECONCILIATION_METHODS,
+        default=None,
+        help="Make predictions of counties and states add up, bottom_up only "
+        "fits counties",
+    )
+    args = parser.parse_args()
+    covidMesher = CovidMesher(
+        args.source,
+        args.target,
+        args.checkpoint,
+        args.revision_window,
+        args.dump_workers,
+        args.dump_threads,
+        args.output_profile,
+        args.serializer,
+        not args.no_bundle,
+        args.predict,
+        args.predict_workers,
+        args.predict_engine,
+        args.prediction_cache,
+        args.reconcile_predictions,
+    )
+    covidMesher.mesh(args.incremental)
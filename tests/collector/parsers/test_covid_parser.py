@@ -0,0 +1,35 @@
+import numpy as np
+from collector.parsers.covid_parser import CovidParser
+
+
+class CovidParserTestCase:
+    def test_read_csv(self, tmp_path):
+        csv_file = tmp_path / "a.csv"
+        csv_file.write_text('date,state,positive\n20200301,CA,"1"\n\n20200302,NY\n')
+        rows = list(
+            CovidParser.read_csv(str(csv_file), ("date", "positive"), {"positive": int})
+        )
+        assert rows == [{"date": "20200301", "positive": 1}, {"date": "20200302"}]
+
+    def test_read_csv_table(self, tmp_path):
+        csv_file = tmp_path / "b.csv"
+        csv_file.write_text(
+            "UID,Combined_Key,Population,3/1/20,3/2/20\n" '1,"A, B",10,1,2.0\n' "2,C\n"
+        )
+        (headers, rows, values) = CovidParser.read_csv_table(
+            str(csv_file),
+            ("UID", "Combined_Key"),
+            ("Combined_Key", "Population"),
+            np.float64,
+        )
+        assert headers == ["3/1/20", "3/2/20"]
+        assert rows == [{"UID": "1", "Combined_Key": "A, B"}]
+        assert values.tolist() == [[1, 2]]
+        # Without any of the columns values are after, all columns are values
+        csv_file.write_text("3/1/20,3/2/20\n1,2\n")
+        (headers, rows, values) = CovidParser.read_csv_table(
+            str(csv_file), ("UID",), ("Combined_Key", "Population"), np.float64
+        )
+        assert headers == ["3/1/20", "3/2/20"]
+        assert rows == [{}]
+        assert values.tolist() == [[1, 2]]
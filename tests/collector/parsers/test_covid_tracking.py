@@ -1,9 +1,10 @@
+from collector.data_cube import DataCube
 from collector.parsers import CovidTrackingParser
 
 
 class CovidTrackingParserTestCase:
     def test_parser(self):
-        data = {}
+        data = DataCube()
         covidTrackingParser = CovidTrackingParser(data, "../covid-data-sources")
         covidTrackingParser.parse()
         us_settled_cases_ts = covidTrackingParser.get_data_us_settled_cases_ts()
@@ -12,3 +13,42 @@ class CovidTrackingParserTestCase:
         assert len(us_settled_cases_ts) == len(us_positive_rate_ts)
         assert len(us_settled_cases_ts) == len(us_pending_cases_ts)
         assert len(us_settled_cases_ts) > 100
+
+    def test_positive_rates(self, tmp_path):
+        folder = tmp_path / "covid-tracking-data/data"
+        folder.mkdir(parents=True)
+        (folder / "us_daily.csv").write_text(
+            "date,states,positive,negative,pending\n"
+            "20200304,56,30,170,5\n"
+            "20200303,56,10,90,\n"
+            "20200302,56,4,36,1\n"
+        )
+        (folder / "states_daily_4pm_et.csv").write_text(
+            "date,state,positive,negative,pending\n"
+            "20200304,CA,7,33,1\n"
+            "20200302,CA,2,8,\n"
+            "20200301,CA,1,1,\n"
+        )
+        data = DataCube()
+        parser = CovidTrackingParser(data, str(tmp_path))
+        parser.parse()
+        assert parser.get_data_us_positive_rate_ts() == {
+            "3/4/20": 20.0,
+            "3/3/20": 10.0,
+            "3/2/20": 10.0,
+        }
+        assert parser.get_data_us_settled_cases_ts()["3/3/20"] == 100
+        # Missing days count as 0 cases, days before 3/2/20 keep positive cases
+        assert parser.get_data_state_positive_rate_ts("06") == {
+            "3/4/20": 17.5,
+            "3/3/20": 0.0,
+            "3/2/20": 20.0,
+            "3/1/20": 1,
+        }
+        assert parser.get_data_us_positive_rate_dl("3/3/20") == {"06": 0.0}
+        assert parser.get_data_state_pending_cases_ts("06") == {
+            "3/4/20": 1,
+            "3/2/20": 0,
+            "3/1/20": 0,
+        }
+        assert parser.get_data_state_positive_rate_ts("36") == {}
@@ -0,0 +1,82 @@
+import json
+import numpy as np
+from collector.parsers.descarte import DescartesMobilityParser, get_weighted_average
+from collector.us import state_fips_iterator
+
+
+class DescartesMobilityParserTestCase:
+    def test_load(self, tmp_path):
+        (tmp_path / "DL-COVID-19").mkdir()
+        records = [
+            {
+                "fips": x,
+                "date": ["2020-03-02", "2020-03-01"],
+                "m50": [1.5, 2.5],
+                "m50_index": [50, 100],
+                "samples": [1, 1],
+            }
+            for x in state_fips_iterator()
+        ]
+        records.append(
+            {"fips": "06085", "date": ["2020-03-03"], "m50": [3], "m50_index": [70]}
+        )
+        records.append(
+            {
+                "fips": "36061",
+                "date": ["2020-02-28", "2020-03-01", "2020-03-03"],
+                "m50": [1, 2, 3],
+                "m50_index": [10, 20, 30],
+            }
+        )
+        records.append(
+            {
+                "fips": "36047",
+                "date": ["2020-03-01", "2020-03-02", "2020-03-03"],
+                "m50": [1, None, 3],
+                "m50_index": [40, None, 60],
+            }
+        )
+        (tmp_path / "DL-COVID-19/DL-us-mobility.ndjson").write_text(
+            "\n".join(json.dumps(x) for x in records) + "\n"
+        )
+        parser = DescartesMobilityParser(None, str(tmp_path), "3/1/20", "3/3/20", 1)
+        parser.load()
+        # 2/28/20 to the last day to predict, 3/4/20
+        assert (parser.first_day, parser.m50_index.shape[1]) == (37, 6)
+        assert not parser.m50_index_present[parser.fips_rows["06085"], 0]
+        assert parser.get_m50_index("36061") == {
+            "2/28/20": 10,
+            "3/1/20": 20,
+            "3/2/20": 20,
+            "3/3/20": 30,
+            "3/4/20": 30,
+        }
+        assert parser.get_m50_index("06085") == {
+            "3/1/20": 70,
+            "3/2/20": 70,
+            "3/3/20": 70,
+            "3/4/20": 70,
+        }
+        # Null values of history days are missing values, filled alike
+        assert parser.get_m50_index("36047") == {
+            "3/1/20": 40,
+            "3/2/20": 40,
+            "3/3/20": 60,
+            "3/4/20": 60,
+        }
+        assert parser.get_m50_index("06001") == parser.get_m50_index("06")
+        assert parser.get_m50_index("06") == {
+            "3/1/20": 100,
+            "3/2/20": 50,
+            "3/3/20": 50,
+            "3/4/20": 50,
+        }
+        assert parser.get_us_m50_index()["3/1/20"] == 100
+
+    def test_get_weighted_average(self):
+        values = np.array([[1.0, np.nan, np.nan], [3.0, 4.0, np.nan], [5.0, 6, 7]])
+        averages = get_weighted_average(
+            values, np.array([1.0, 3.0, 2.0]), np.array([0, 0, 1]), 2
+        )
+        # Weights of missing values go to the other regions of the group
+        assert np.array_equal(averages, [[2.5, 4, np.nan], [5, 6, 7]], equal_nan=True)
@@ -0,0 +1,29 @@
+from collector.parsers.jhu import JhuUsTimeSeries
+from collector.utils import Calendar
+
+headers = "UID,iso2,iso3,code3,FIPS,Admin2,Province_State,Country_Region,Lat,Long_,Combined_Key"
+
+
+class JhuUsTimeSeriesTestCase:
+    def test_load_aligns_deaths_by_uid(self, tmp_path):
+        confirmed_file = tmp_path / "confirmed.csv"
+        deaths_file = tmp_path / "deaths.csv"
+        confirmed_file.write_text(
+            f"{headers},1/22/20,1/23/20\n"
+            '1,US,USA,840,6085.0,Santa Clara,California,US,1,2,"Santa Clara, California, US",1,2.0\n'
+            '2,US,USA,840,60,,American Samoa,US,1,2,"American Samoa, US",3,4\n'
+        )
+        deaths_file.write_text(
+            f"{headers},Population,1/22/20,1/23/20\n"
+            '2,US,USA,840,60,,American Samoa,US,1,2,"American Samoa, US",55641,0,1\n'
+            '1,US,USA,840,6085.0,Santa Clara,California,US,1,2,"Santa Clara, California, US",1927852,0,0.0\n'
+        )
+        time_series = JhuUsTimeSeries(Calendar())
+        time_series.load(str(confirmed_file), str(deaths_file))
+        assert (time_series.first_day, time_series.last_day) == (0, 1)
+        assert [x["FIPS"] for x in time_series.metadata] == ["06085", "60001"]
+        assert time_series.metadata[1]["Admin2"] == "American Samoa"
+        assert time_series.metadata[0]["Population"] == "1927852"
+        assert time_series.confirmed.dtype.name == "int32"
+        assert time_series.confirmed.tolist() == [[1, 2], [3, 4]]
+        assert time_series.deaths.tolist() == [[0, 0], [0, 1]]
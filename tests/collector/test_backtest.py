@@ -0,0 +1,34 @@
+import numpy as np
+from collector.backtest import PredictionBacktest, get_cutoff_days
+from .test_covid_predictor import make_cube
+
+
+class PredictionBacktestTestCase:
+    def test_get_cutoff_days(self):
+        assert get_cutoff_days(0, 39, 5, 3, 7, 20) == [20, 27, 34]
+        assert get_cutoff_days(0, 39, 5, 3, 7, 25) == [27, 34]
+
+    def test_backtest(self):
+        cube = make_cube(40, 5)
+        backtest = PredictionBacktest(cube, 5, [27, 34])
+        results = backtest.run("growth")
+        assert results["cutoffs"] == ["2/18/20", "2/25/20"]
+        assert results["wall_time"] > 0
+        metrics = results["metrics"]["confirmed"]
+        assert list(metrics) == ["us", "states", "counties"]
+        # The us has no cases, predicted as such
+        assert metrics["us"]["mae"] == [0] * 5
+        assert np.isnan(metrics["us"]["mape"]).all()
+        assert len(metrics["counties"]["mape"]) == 5
+        assert metrics["counties"]["mae"][4] >= metrics["counties"]["mae"][0]
+        # Backtests do not change data
+        expected = make_cube(40, 5)
+        for fips in ("0", "06", "06085"):
+            assert cube.series_dict("confirmed", fips) == expected.series_dict(
+                "confirmed", fips
+            )
+        in_process = backtest.run_in_process("growth")
+        assert in_process["metrics"]["deaths"]["counties"] == (
+            results["metrics"]["deaths"]["counties"]
+        )
+        assert in_process["peak_memory_mb"] > 0
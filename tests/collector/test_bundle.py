@@ -0,0 +1,57 @@
+import numpy as np
+from collector.bundle import DataBundle, write_bundle
+from collector.utils import Calendar
+from .test_data_cube import make_cube
+
+
+class DataBundleTestCase:
+    def test_write_and_map(self, tmp_path):
+        cube = make_cube()
+        cube.attachments["US"]["06"] = {
+            "testing": {"positive_rate": {"time_series": {"1/21/20": 0.5}}}
+        }
+        path = str(tmp_path / "us.bundle")
+        write_bundle(cube, path)
+        bundle = DataBundle(path)
+        assert isinstance(bundle.values, np.memmap)
+        assert bundle.values.offset % 64 == 0
+        assert bundle.dates == ["1/21/20", "1/22/20", "1/23/20", "1/24/20"]
+        assert bundle.metrics[:2] == ["confirmed", "mobility"]
+        assert bundle.series("confirmed", "06001", "1/22/20", "1/23/20").tolist() == [
+            0,
+            5,
+        ]
+        assert bundle.series_dict("confirmed", "0") == {
+            "1/22/20": 8,
+            "1/23/20": 15,
+            "1/24/20": 18,
+        }
+        assert bundle.series_dict("mobility", "06001") == {}
+        assert bundle.series_dict("testing/positive_rate", "06") == {"1/21/20": 0.5}
+
+    def test_request_dates(self, tmp_path):
+        path = str(tmp_path / "us.bundle")
+        write_bundle(make_cube(), path)
+        calendar = Calendar()
+        bundle = DataBundle(path, calendar)
+        num_titles = len(calendar._titles)
+        # Dates outside the date axis are clamped, not added to the calendar
+        assert list(bundle.series_dict("confirmed", "0", "01/23/20", "12/31/30")) == [
+            "1/23/20",
+            "1/24/20",
+        ]
+        assert bundle.series_dict("confirmed", "0", "1/1/19", "1/22/20") == {
+            "1/22/20": 8
+        }
+        assert len(calendar._titles) == num_titles
+        assert "12/31/30" not in calendar._days
+
+    def test_bad_file(self, tmp_path):
+        path = tmp_path / "us.bundle"
+        path.write_bytes(b"NOTABUNDLE" + bytes(64))
+        try:
+            DataBundle(str(path))
+        except ValueError as e:
+            assert "is not a data bundle" in str(e)
+        else:
+            assert False
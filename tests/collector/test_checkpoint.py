@@ -0,0 +1,18 @@
+from collector.checkpoint import MeshCheckpoint, get_file_fingerprint
+from collector.utils import Calendar
+from .test_data_cube import make_cube
+
+
+class MeshCheckpointTestCase:
+    def test_save_load(self, tmp_path):
+        checkpoint = MeshCheckpoint(str(tmp_path / "checkpoint.npz"))
+        assert checkpoint.load(Calendar()) == (None, {})
+        source_file = tmp_path / "source.csv"
+        source_file.write_text("a,b\n")
+        fingerprints = {"source.csv": get_file_fingerprint(str(source_file))}
+        cube = make_cube()
+        checkpoint.save(cube, fingerprints)
+        (previous, previous_fingerprints) = checkpoint.load(Calendar())
+        assert previous_fingerprints == fingerprints
+        assert previous.changed_regions(cube) == set()
+        assert get_file_fingerprint(str(tmp_path / "missing.csv")) is None
@@ -0,0 +1,143 @@
+import numpy as np
+from collector.covid_predictor import CovidPredictor
+from collector.data_cube import DataCube, json_int, json_number
+from collector.us import state_fips_iterator
+from collector.utils import Calendar
+
+
+def make_cube(num_days, days_to_predict):
+    # Cases of all states and the us, growing in California and New York
+    cube = DataCube(Calendar())
+    cube.set_history(0, num_days - 1)
+    cube.add_series("confirmed", np.int32, json_int)
+    cube.add_series("deaths", np.int32, json_int)
+    cube.add_series("mobility", np.float64, json_number)
+    fips = ["0"] + list(state_fips_iterator()) + ["06085", "36061"]
+    values = np.zeros((len(fips), num_days))
+    for (i, x) in enumerate(fips):
+        if x[:2] in ("06", "36"):
+            values[i] = np.arange(num_days) // (2 + i % 2)
+    for name in ("confirmed", "deaths"):
+        cube.set_series(name, fips, 0, values, np.ones(values.shape, dtype=bool))
+    mobility = np.linspace(40, 80, num_days + days_to_predict)
+    cube.set_series(
+        "mobility",
+        fips,
+        0,
+        np.tile(mobility, (len(fips), 1)),
+        np.ones((len(fips), len(mobility)), dtype=bool),
+    )
+    return cube
+
+
+class CovidPredictorTestCase:
+    def test_parallel_predict(self):
+        predictions = []
+        for workers in (1, 2):
+            cube = make_cube(8, 3)
+            predictor = CovidPredictor(cube, 3, "1/22/20", "1/29/20", workers, 4)
+            predictor.predict()
+            predictions.append({x: cube.series_dict("confirmed", x) for x in cube.fips})
+        assert predictions[0] == predictions[1]
+        cube = make_cube(8, 3)
+        predictor = CovidPredictor(cube, 3, "1/22/20", "1/29/20")
+        expected = predictor.predict_with_time_series(
+            cube.series_dict("confirmed", "06085"),
+            cube.series_dict("mobility", "06085"),
+        )
+        assert list(expected) == ["1/30/20", "1/31/20", "2/1/20"]
+        assert {x: predictions[1]["06085"][x] for x in expected} == expected
+        # Cases of the us do not change, predictions neither
+        assert predictions[1]["0"]["2/1/20"] == predictions[1]["0"]["1/29/20"]
+
+    def test_growth_engine(self):
+        cube = make_cube(30, 5)
+        predictor = CovidPredictor(cube, 5, "1/22/20", "2/20/20", engine="growth")
+        predictor.predict()
+        for fips in ("0", "06", "06085", "36061"):
+            cases = list(cube.series_dict("deaths", fips).values())
+            assert len(cases) == 35
+            assert all(x <= y for (x, y) in zip(cases, cases[1:]))
+        assert cube.series_dict("confirmed", "0")["2/25/20"] == 0
+        cases = cube.series_dict("confirmed", "06")
+        assert cases["2/25/20"] >= cases["2/21/20"] >= cases["2/20/20"] > 0
+
+    def test_prediction_cache(self, tmp_path):
+        cache_file = str(tmp_path / "prediction_cache.json")
+        cube = make_cube(30, 5)
+        predictor = CovidPredictor(
+            cube, 5, "1/22/20", "2/20/20", engine="growth", cache_file=cache_file
+        )
+        predictor.predict()
+        assert (predictor.cache.hits, predictor.cache.misses) == (0, 108)
+        expected = cube.series_dict("confirmed", "06085")
+        cube = make_cube(30, 5)
+        cube.update_series("confirmed", "36061", {"2/20/20": 20})
+        predictor = CovidPredictor(
+            cube, 5, "1/22/20", "2/20/20", engine="growth", cache_file=cache_file
+        )
+        predictor.predict()
+        assert (predictor.cache.hits, predictor.cache.misses) == (107, 1)
+        assert cube.series_dict("confirmed", "06085") == expected
+
+    def test_warm_start(self, tmp_path):
+        cache_file = str(tmp_path / "prediction_cache.json")
+        cube = make_cube(30, 5)
+        predictor = CovidPredictor(
+            cube, 5, "1/22/20", "2/20/20", engine="growth", cache_file=cache_file
+        )
+        predictor.predict()
+        assert predictor.starts == {"cold": 108, "warm": 0, "restart": 0}
+        # Fits of one more day start from the parameters of the last run
+        cube = make_cube(31, 5)
+        predictor = CovidPredictor(
+            cube, 5, "1/22/20", "2/21/20", engine="growth", cache_file=cache_file
+        )
+        predictor.predict()
+        assert predictor.starts["cold"] == 0
+        assert predictor.starts["warm"] + predictor.starts["restart"] == 108
+        assert predictor.starts["warm"] > 0
+        cases = cube.series_dict("confirmed", "06")
+        assert cases["2/26/20"] >= cases["2/21/20"] > 0
+
+    def test_reconciliation(self):
+        for reconciliation in ("bottom_up", "ols", "wls"):
+            cube = make_cube(30, 5)
+            # New York also has cases of no county, growing up to 87 by 2/20/20
+            cases = cube.series_dict("confirmed", "36061")
+            cube.update_series(
+                "confirmed",
+                "36",
+                {x: y + 3 * i for (i, (x, y)) in enumerate(cases.items())},
+            )
+            predictor = CovidPredictor(
+                cube,
+                5,
+                "1/22/20",
+                "2/20/20",
+                engine="growth",
+                reconciliation=reconciliation,
+            )
+            predictor.predict()
+            for case_type in ("confirmed", "deaths"):
+                cases = {x: cube.series_dict(case_type, x) for x in cube.fips}
+                for fips in ("0", "06", "06085", "36061"):
+                    assert cases[fips]["2/25/20"] >= cases[fips]["2/21/20"]
+                    assert cases[fips]["2/21/20"] >= cases[fips]["2/20/20"]
+                # Predicted cases of counties add up to those of their state,
+                # and those of states to the us, with the cases of no child
+                # of 2/20/20
+                for (fips, children) in [("0", list(state_fips_iterator()))] + [
+                    (x, cube.child_fips(x)) for x in state_fips_iterator()
+                ]:
+                    if not children:
+                        continue
+                    remainder = cases[fips]["2/20/20"] - sum(
+                        cases[x]["2/20/20"] for x in children
+                    )
+                    for day in ("2/21/20", "2/23/20", "2/25/20"):
+                        assert cases[fips][day] == remainder + sum(
+                            cases[x][day] for x in children
+                        )
+                if case_type == "confirmed":
+                    assert cases["36"]["2/25/20"] == cases["36061"]["2/25/20"] + 87
@@ -0,0 +1,126 @@
+import numpy as np
+from collector.data_cube import DataCube, json_int, json_number
+from collector.utils import Calendar
+
+
+def make_cube():
+    cube = DataCube(Calendar())
+    cube.set_history(0, 2)
+    cube.add_series("confirmed", np.int32, json_int)
+    cube.add_series("mobility", np.float64, json_number)
+    for (fips, cases) in (
+        ("06085", [1, 2, 3]),
+        ("06001", [0, 5, 6]),
+        ("36061", [7, 8, 9]),
+    ):
+        row = cube.add_region(fips)
+        series = cube.series["confirmed"]
+        series.values[row, cube.columns(0, 2)] = cases
+        series.present[row, cube.columns(0, 2)] = True
+        series.declared[row] = True
+        cube.populations[row] = 100
+        cube.names[row] = fips
+        cube.hashes[row] = int(fips)
+    for fips in ("0", "06", "36"):
+        cube.series["confirmed"].declared[cube.rows[fips]] = True
+    cube.roll_up("confirmed", 0, 2)
+    return cube
+
+
+class DataCubeTestCase:
+    def test_hierarchy(self):
+        cube = make_cube()
+        assert cube.fips[:3] == ["0", "06", "06085"]
+        assert cube.child_fips("0") == ["06", "36"]
+        assert cube.child_fips("06") == ["06085", "06001"]
+        assert cube.parents[cube.rows["36061"]] == cube.rows["36"]
+
+    def test_roll_up(self):
+        cube = make_cube()
+        assert cube.series_dict("confirmed", "06") == {
+            "1/22/20": 1,
+            "1/23/20": 7,
+            "1/24/20": 9,
+        }
+        assert cube.series_dict("confirmed", "0")["1/24/20"] == 18
+
+    def test_update_series_grows_days(self):
+        cube = make_cube()
+        cube.update_series("mobility", "06085", {"1/21/20": 3, "1/26/20": None})
+        assert (cube.first_day, cube.num_days) == (-1, 6)
+        assert cube.series_dict("mobility", "06085") == {"1/21/20": 3, "1/26/20": None}
+        assert cube.series_dict("confirmed", "06085")["1/24/20"] == 3
+
+    def test_region_json(self):
+        cube = make_cube()
+        county = cube.region_json("06085")
+        assert county["confirmed"] == {"1/22/20": 1, "1/23/20": 2, "1/24/20": 3}
+        assert (county["population"], county["name"], county["hash"]) == (
+            100,
+            "06085",
+            6085,
+        )
+        assert "mobility" not in county
+        cube.attachments["US"]["06"] = {"votes2016": {"v": 1}}
+        state = cube.region_json("06")
+        assert state["confirmed"]["time_series"]["1/23/20"] == 7
+        assert state["confirmed"]["1/23/20"] == {"06085": 2, "06001": 5}
+        assert state["population"] == {"06085": 100, "06001": 100}
+        assert state["hashes"] == {6085: "06085", 6001: "06001"}
+        assert state["votes2016"] == {"v": 1}
+
+    def test_iter_region_json_order(self):
+        cube = make_cube()
+        cube.attachments["US"]["72"] = {"testing": {}}
+        order = [fips for (fips, _) in cube.iter_region_json()]
+        assert order == ["0", "06085", "06001", "06", "36061", "36", "72"]
+
+    def test_share_series(self):
+        cube = make_cube()
+        cube.update_series("mobility", "06", {"1/22/20": 50, "1/23/20": 60})
+        cube.share_series("mobility", ["06085", "06001"], "06")
+        series = cube.series["mobility"]
+        assert not series.present[cube.rows["06085"]].any()
+        shared = {}
+        (county, other) = (
+            cube.region_json(x, shared)["mobility"] for x in ("06085", "06001")
+        )
+        assert county == {"1/22/20": 50, "1/23/20": 60}
+        assert county is other
+        assert cube.region_json("06")["mobility"]["1/23/20"] == {
+            "06085": 60,
+            "06001": 60,
+        }
+        # Updates of the state show in the counties, setting a county ends sharing
+        previous = make_cube()
+        previous.copy_series("mobility", cube)
+        assert previous.changed_regions(cube) == set()
+        cube.update_series("mobility", "06", {"1/24/20": 70})
+        assert cube.series_dict("mobility", "06001")["1/24/20"] == 70
+        cube.update_series("mobility", "06001", {"1/24/20": 80})
+        assert cube.series_dict("mobility", "06001") == {"1/24/20": 80}
+        assert cube.series_dict("mobility", "06085")["1/24/20"] == 70
+        assert cube.changed_regions(previous) == {"06085", "06001", "06", "0"}
+
+    def test_changed_regions(self):
+        previous = make_cube()
+        cube = make_cube()
+        assert cube.changed_regions(previous) == set()
+        cube.series["confirmed"].values[cube.rows["06001"], 1] = 4
+        cube.attachments["US"]["72"] = {"testing": {}}
+        assert cube.changed_regions(previous) == {"06001", "06", "0", "72"}
+        cube.ensure_days(0, 3)
+        assert len(cube.changed_regions(previous)) == 7
+
+    def test_checkpoint_round_trip(self):
+        cube = make_cube()
+        cube.update_series("mobility", "36", {"1/23/20": 1.5, "1/24/20": None})
+        cube.share_series("mobility", ["36061"], "36")
+        cube.legends["confirmed"] = {"06": np.arange(12).reshape(4, 3)}
+        cube.attachments["US"]["06"] = {"votes2016": {"v": 1}}
+        (metadata, arrays) = cube.to_checkpoint()
+        copy = DataCube.from_checkpoint(metadata, arrays, cube.calendar)
+        assert copy.fips == cube.fips
+        assert copy.changed_regions(cube) == set()
+        assert copy.region_json("36") == cube.region_json("36")
+        assert copy.region_json("36061") == cube.region_json("36061")
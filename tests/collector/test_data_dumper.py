@@ -0,0 +1,98 @@
+import gzip
+import json
+import hashlib
+from collector.data_dumper import DataDumper, COMPRESSIONS
+from .test_data_cube import make_cube
+
+
+def read_json_files(folder):
+    return {
+        str(x.relative_to(folder)): x.read_text()
+        for x in sorted(folder.glob("us/**/*.json"))
+    }
+
+
+class DataDumperTestCase:
+    def test_parallel_dump_is_deterministic(self, tmp_path):
+        cube = make_cube()
+        DataDumper(cube, str(tmp_path / "serial")).dump_data()
+        files = read_json_files(tmp_path / "serial")
+        assert sorted(files) == [
+            "us/0.json",
+            "us/06.json",
+            "us/06/001.json",
+            "us/06/085.json",
+            "us/36.json",
+            "us/36/061.json",
+        ]
+        for use_threads in (False, True):
+            folder = tmp_path / f"threads_{use_threads}"
+            DataDumper(cube, str(folder), 3, use_threads, chunk_size=1).dump_data()
+            assert read_json_files(folder) == files
+
+    def test_dump_regions(self, tmp_path):
+        DataDumper(make_cube(), str(tmp_path)).dump_data({"06", "06085"})
+        assert sorted(read_json_files(tmp_path)) == ["us/06.json", "us/06/085.json"]
+
+    def test_compact_profile(self, tmp_path):
+        cube = make_cube()
+        DataDumper(cube, str(tmp_path), profile="compact").dump_data({"06085"})
+        json_file = tmp_path / "us/06/085.json"
+        content = json_file.read_bytes()
+        assert content.startswith(b'{"least_recent_date":"1/22/20",')
+        assert gzip.decompress((tmp_path / "us/06/085.json.gz").read_bytes()) == content
+        if "br" in COMPRESSIONS:
+            assert (tmp_path / "us/06/085.json.br").exists()
+        # Siblings are removed with the pretty profile
+        DataDumper(cube, str(tmp_path)).dump_data({"06085"})
+        assert sorted(x.name for x in (tmp_path / "us/06").iterdir()) == ["085.json"]
+
+    def test_manifest_skips_unchanged_files(self, tmp_path):
+        cube = make_cube()
+        DataDumper(cube, str(tmp_path), profile="compact").dump_data()
+        manifest = json.loads((tmp_path / "manifest.json").read_text())
+        content = (tmp_path / "us/06/085.json").read_bytes()
+        assert manifest["us/06/085.json"] == hashlib.sha256(content).hexdigest()
+        assert "us/06/085.json.gz" in manifest
+        mtimes = {
+            x: x.stat().st_mtime_ns
+            for x in tmp_path.glob("us/**/*.json*")
+            if x.suffix != ".br"
+        }
+        cube.series["confirmed"].values[cube.rows["06001"], 2] = 7
+        cube.roll_up("confirmed", 0, 2)
+        DataDumper(cube, str(tmp_path), profile="compact").dump_data()
+        changed = sorted(
+            str(x.relative_to(tmp_path))
+            for (x, mtime) in mtimes.items()
+            if x.stat().st_mtime_ns != mtime
+        )
+        assert changed == [
+            "us/0.json",
+            "us/0.json.gz",
+            "us/06.json",
+            "us/06.json.gz",
+            "us/06/001.json",
+            "us/06/001.json.gz",
+        ]
+        DataDumper(cube, str(tmp_path)).dump_data({"06001"})
+        manifest = json.loads((tmp_path / "manifest.json").read_text())
+        assert "us/06/001.json.gz" not in manifest
+        assert "us/06/085.json.gz" in manifest
+
+    def test_siblings_of_missing_compressions(self, tmp_path, monkeypatch):
+        # br siblings of a dump with brotli are removed by one without it
+        cube = make_cube()
+        monkeypatch.setitem(COMPRESSIONS, "br", lambda content: b"br" + content)
+        DataDumper(cube, str(tmp_path), profile="compact").dump_data()
+        assert (tmp_path / "us/06/085.json.br").exists()
+        assert "us/06/085.json.br" in json.loads(
+            (tmp_path / "manifest.json").read_text()
+        )
+        monkeypatch.delitem(COMPRESSIONS, "br")
+        DataDumper(cube, str(tmp_path), profile="compact").dump_data({"06085"})
+        assert not (tmp_path / "us/06/085.json.br").exists()
+        assert (tmp_path / "us/06/085.json.gz").exists()
+        manifest = json.loads((tmp_path / "manifest.json").read_text())
+        assert "us/06/085.json.br" not in manifest
+        assert "us/06/085.json.gz" in manifest
@@ -0,0 +1,33 @@
+import numpy as np
+from collector.growth_model import fit_logistic_growth, logistic_growth
+
+
+class GrowthModelTestCase:
+    def test_fit_logistic_growth(self):
+        days = np.arange(60, dtype=np.float64)
+        mobility = np.tile(0.3 * np.sin(days / 5), (3, 1))
+        params = np.array(
+            [
+                [0.5, np.log(0.1), 50, 0],
+                [0, np.log(0.2), 30, 1],
+                [1, np.log(0.05), 70, 0],
+            ]
+        )
+        (curves, _) = logistic_growth(params, days, mobility)
+        counts = curves / curves.max(axis=1)[:, None]
+        (fitted, converged, _) = fit_logistic_growth(days, counts, mobility)
+        assert converged.all()
+        (fitted_curves, _) = logistic_growth(fitted, days, mobility)
+        assert np.abs(fitted_curves - counts).max() < 1e-4
+        assert np.allclose(np.exp(fitted[:2, 1]), [0.1, 0.2], rtol=1e-2)
+        (_, _, iterations) = fit_logistic_growth(days, counts, mobility)
+        # Fits of counts of one more day starting from the last fit
+        more_days = np.arange(61, dtype=np.float64)
+        more_mobility = np.tile(0.3 * np.sin(more_days / 5), (3, 1))
+        (more_curves, _) = logistic_growth(params, more_days, more_mobility)
+        more_counts = more_curves / curves.max(axis=1)[:, None]
+        (_, converged, warm_iterations) = fit_logistic_growth(
+            more_days, more_counts, more_mobility, fitted, max_iterations=10
+        )
+        assert converged.all()
+        assert (warm_iterations < iterations).all()
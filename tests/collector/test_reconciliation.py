@@ -0,0 +1,37 @@
+import numpy as np
+from collector.reconciliation import reconcile, summing_matrix
+
+
+class ReconciliationTestCase:
+    def test_reconcile(self):
+        # us, two states, and three counties of the first state
+        parents = [-1, 0, 0, 1, 1, 1]
+        (summing, bottoms) = summing_matrix(parents)
+        assert bottoms.tolist() == [2, 3, 4, 5]
+        assert summing.toarray().tolist() == [
+            [1, 1, 1, 1],
+            [0, 1, 1, 1],
+            [1, 0, 0, 0],
+            [0, 1, 0, 0],
+            [0, 0, 1, 0],
+            [0, 0, 0, 1],
+        ]
+        predictions = np.array(
+            [[100, 110], [60, 70], [35, 40], [10, 11], [20, 22], [30, 33]],
+            dtype=np.float64,
+        )
+        assert reconcile(predictions, summing, bottoms, "bottom_up").tolist() == [
+            [35, 40],
+            [10, 11],
+            [20, 22],
+            [30, 33],
+        ]
+        dense = summing.toarray()
+        expected = np.linalg.lstsq(dense, predictions, rcond=None)[0]
+        assert np.allclose(reconcile(predictions, summing, bottoms, "ols"), expected)
+        # Coherent predictions stay as they are
+        coherent = dense @ expected
+        for method in ("ols", "wls"):
+            assert np.allclose(
+                dense @ reconcile(coherent, summing, bottoms, method), coherent
+            )
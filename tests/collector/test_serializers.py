@@ -0,0 +1,21 @@
+import json
+import pytest
+from collector.serializers import SERIALIZERS, get_serializer
+
+data = {"1/22/20": {"minCases": 1, "06085": 0.5}, "hashes": {6085: "06085"}, "a": None}
+
+
+class SerializersTestCase:
+    def test_json_serializer(self):
+        serializer = get_serializer()
+        assert serializer.dumps({"a": "é", "b": [1]}) == '{"a":"é","b":[1]}'.encode()
+        assert serializer.dumps({"b": 1}, 4) == b'{\n    "b": 1\n}'
+
+    @pytest.mark.parametrize("name", list(SERIALIZERS))
+    def test_serializers_agree(self, name):
+        if not SERIALIZERS[name].is_available():
+            pytest.skip(f"{name} not installed")
+        serializer = get_serializer(name)
+        expected = json.loads(json.dumps(data))
+        assert json.loads(serializer.dumps(data)) == expected
+        assert json.loads(serializer.dumps(data, 4)) == expected
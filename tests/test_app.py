@@ -0,0 +1,92 @@
+import os
+import gzip
+import hashlib
+import importlib.util
+from collector.bundle import write_bundle
+from .collector.test_data_cube import make_cube
+
+# app.py is shadowed by the app package, load it from its file
+spec = importlib.util.spec_from_file_location(
+    "covid_app", os.path.join(os.path.dirname(__file__), "..", "app.py")
+)
+covid_app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(covid_app)
+application = covid_app.application
+
+
+class AppTestCase:
+    def test_get_covid_data_precompressed(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(application, "root_path", str(tmp_path))
+        data_folder = tmp_path / "data/covid/us"
+        data_folder.mkdir(parents=True)
+        (data_folder / "0.json").write_bytes(b'{"a":1}')
+        (data_folder / "0.json.gz").write_bytes(gzip.compress(b'{"a":1}'))
+        client = application.test_client()
+        response = client.get("/covid/us/0.json")
+        assert response.data == b'{"a":1}'
+        assert "Content-Encoding" not in response.headers
+        assert response.headers["Vary"] == "Accept-Encoding"
+        response = client.get(
+            "/covid/us/0.json", headers={"Accept-Encoding": "br, gzip;q=0.5"}
+        )
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.mimetype == "application/json"
+        assert gzip.decompress(response.data) == b'{"a":1}'
+        response = client.get(
+            "/covid/us/0.json", headers={"Accept-Encoding": "gzip;q=0"}
+        )
+        assert "Content-Encoding" not in response.headers
+        assert client.get("/covid/us/1.json").status_code == 404
+
+    def test_get_covid_data_conditional(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(application, "root_path", str(tmp_path))
+        data_folder = tmp_path / "data/covid/us"
+        data_folder.mkdir(parents=True)
+        (data_folder / "0.json").write_bytes(b'{"a":1}')
+        client = application.test_client()
+        response = client.get("/covid/us/0.json")
+        (etag, last_modified) = (
+            response.headers["ETag"],
+            response.headers["Last-Modified"],
+        )
+        assert etag == '"%s"' % hashlib.sha256(b'{"a":1}').hexdigest()
+        assert "max-age=600" in response.headers["Cache-Control"]
+        response = client.get("/covid/us/0.json", headers={"If-None-Match": etag})
+        assert response.status_code == 304 and response.data == b""
+        response = client.get(
+            "/covid/us/0.json", headers={"If-Modified-Since": last_modified},
+        )
+        assert response.status_code == 304
+        (data_folder / "0.json").write_bytes(b'{"a":22}')
+        response = client.get("/covid/us/0.json", headers={"If-None-Match": etag})
+        assert response.status_code == 200 and response.data == b'{"a":22}'
+
+    def test_file_cache_is_bounded(self, tmp_path):
+        cache = covid_app.FileCache(10)
+        for (name, content) in (("a", b"123456"), ("b", b"1234"), ("c", b"12")):
+            (tmp_path / name).write_bytes(content)
+            assert cache.get(str(tmp_path / name))[0] == content
+        assert list(cache.files) == [str(tmp_path / "b"), str(tmp_path / "c")]
+        assert cache.num_bytes == 6
+
+    def test_get_covid_data_slice(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(application, "root_path", str(tmp_path))
+        (tmp_path / "data/covid/us").mkdir(parents=True)
+        (tmp_path / "data/covid/us/0.json").write_bytes(b'{"a":1}')
+        write_bundle(make_cube(), str(tmp_path / "data/covid/us.bundle"))
+        client = application.test_client()
+        response = client.get("/covid/us/06001?metric=confirmed&from=1/23/20")
+        assert response.json == {
+            "fips": "06001",
+            "confirmed": {"1/23/20": 5, "1/24/20": 6},
+        }
+        response = client.get("/covid/us/0?metric=confirmed,mobility&to=1/22/20")
+        assert response.get_data(as_text=True) == (
+            '{"fips": "0", "confirmed": {"1/22/20": 8}, "mobility": {}}'
+        )
+        response = client.get("/covid/us/06?from=1/1/20&to=1/1/20")
+        assert response.json["confirmed"] == {}
+        assert client.get("/covid/us/06?metric=deaths").status_code == 400
+        assert client.get("/covid/us/06?from=2020-01-23").status_code == 400
+        assert client.get("/covid/us/01").status_code == 404
+        assert client.get("/covid/us/0.json").data == b'{"a":1}'
@@ -5,8 +5,9 @@ from collector.utils import (
     get_title_tomorrow,
     get_title_yesterday,
     date_range,
+    Calendar,
 )
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 
 class UtilsTestCase:
@@ -31,3 +32,21 @@ class UtilsTestCase:
 
     def test_get_title_from_yyyymmdd(self):
         assert get_title_from_yyyymmdd("20200301") == "3/1/20"
+
+    def test_calendar_days_and_titles(self):
+        calendar = Calendar()
+        assert calendar.day("1/22/20") == 0
+        assert calendar.day("03/01/20") == calendar.day("3/1/20") == 39
+        assert calendar.title(39) == "3/1/20"
+        assert calendar.title(-1) == "1/21/20"
+        assert calendar.title(400) == get_title_from_date(date(2021, 2, 25))
+        assert calendar.day_from_yyyymmdd("20200301") == 39
+        assert calendar.day_from_iso("2020-03-01") == 39
+        assert calendar.titles(38, 40) == ["2/29/20", "3/1/20", "3/2/20"]
+        assert calendar.titles(40, 38) == []
+
+    def test_calendar_yesterday_and_tomorrow(self):
+        calendar = Calendar()
+        assert calendar.title_yesterday("3/1/20") == "2/29/20"
+        assert calendar.title_tomorrow("12/31/20") == "1/1/21"
+        assert calendar.title_future_or_past("1/22/20", -30) == "12/23/19"